@@ -1,116 +1,213 @@
 import os
+import sys
 import time
-import requests
-import pandas as pd
 from datetime import datetime
-import logging
-
-# Load Excel
-try:
-    excel_file = os.path.join(os.getcwd(), "data", "access_token.xlsx")
-    df = pd.read_excel(excel_file)
-except Exception as e:
-    print("Error loading Excel file:", e)
-    # Create data directory if it doesn't exist
-    os.makedirs(os.path.join(os.getcwd(), "data"), exist_ok=True)
-    # Create empty DataFrame with required columns
-    df = pd.DataFrame(columns=['name', 'client_id', 'access_token', 'Type', 'Multiplier'])
-    df.to_excel(excel_file, index=False)
-    print(f"Created new Excel template at: {excel_file}")
-
-
-# Clean up the 'Type' column
-df['Type'] = df['Type'].str.strip().str.lower()
-
-# Debug the cleaned DataFrame
-print("Cleaned DataFrame:")
-print(df)
-print("Unique 'Type' values:", df['Type'].unique())
-
-# Ensure there is a master account
-master_account = df[df['Type'] == 'master']
-if master_account.empty:
-    print("No master account found in the Excel file. Please check the data.")
-    exit()
-
-# Select the first row for the master account
-master_account = master_account.iloc[0]
-
-# Extract child accounts
-child_accounts = df[df['Type'] == 'child']
-if child_accounts.empty:
-    print("No child accounts found in the Excel file. Please check the data.")
-    exit()
-
-print("Master Account:", master_account)
-print("Child Accounts:")
-print(child_accounts)
-
-# Create a day-wise folder for logs
-today_date = datetime.now().strftime('%Y-%m-%d')
-log_folder = os.path.join(os.getcwd(), today_date)
-os.makedirs(log_folder, exist_ok=True)
-
-# Initialize loggers for each child account
+import argparse
+import threading
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+from dhan_session import get_session, REQUEST_TIMEOUT, API_BASE_URL
+from accounts import build_child_records, load_roster
+from order_stream import OrderUpdateStream
+from order_bus import bus, ORDERS
+from order_diff import OrderBookDiff, MODIFIED
+from order_store import OrderStore
+from ttl_cache import TTLCache
+from async_logging import start_file_loggers
+import latency
+
+# Account roster, filled by load_accounts() so importing this module parses nothing
+ACCOUNTS_FILE = os.path.join("data", "access_token.xlsx")
+master_account = None
+child_records = ()
 loggers = {}
-for _, child in child_accounts.iterrows():
-    child_name = child['name']
-    log_file = os.path.join(log_folder, f"{child_name}.log")
-    logger = logging.getLogger(child_name)
-    logger.setLevel(logging.DEBUG)
-    file_handler = logging.FileHandler(log_file)
-    formatter = logging.Formatter('%(asctime)s - %(message)s')
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-    loggers[child_name] = logger
-
-# Function to log messages to a specific child's log
-def log_message(child_name, message):
+log_folder = None
+accounts_lock = threading.Lock()
+
+# Function to load the master/child roster and child loggers once; callers that copy orders run this first
+def load_accounts():
+    global master_account, child_records, loggers, log_folder
+    with accounts_lock:
+        if master_account is not None:
+            return
+        excel_file = os.path.join(os.getcwd(), ACCOUNTS_FILE)
+        try:
+            rows = load_roster(excel_file)
+        except FileNotFoundError as e:
+            print("Error loading Excel file:", e)
+            import pandas as pd
+            # Create data directory if it doesn't exist
+            os.makedirs(os.path.dirname(excel_file), exist_ok=True)
+            # Create empty DataFrame with required columns
+            pd.DataFrame(columns=['name', 'client_id', 'access_token', 'Type', 'Multiplier']).to_excel(excel_file, index=False)
+            print(f"Created new Excel template at: {excel_file}")
+            rows = []
+        except Exception as e:
+            # Never replace an existing workbook because it could not be read
+            print("Error loading Excel file:", e)
+            rows = []
+
+        # Clean up the 'Type' column
+        for row in rows:
+            row['Type'] = str(row.get('Type', '')).strip().lower()
+
+        # Ensure there is a master account, and select the first one
+        masters = [row for row in rows if row['Type'] == 'master']
+        if not masters:
+            print("No master account found in the Excel file. Please check the data.")
+            sys.exit()
+
+        # Extract child accounts
+        child_accounts = [row for row in rows if row['Type'] == 'child']
+        if not child_accounts:
+            print("No child accounts found in the Excel file. Please check the data.")
+            sys.exit()
+
+        print(f"Master Account: {masters[0]['name']} ({masters[0]['client_id']})")
+        print(f"Child Accounts: {len(child_accounts)}")
+
+        # Precompile the child roster once so the copy path does no pandas work
+        child_records = build_child_records(child_accounts)
+
+        # Create a day-wise folder for logs
+        log_folder = os.path.join(os.getcwd(), datetime.now().strftime('%Y-%m-%d'))
+        os.makedirs(log_folder, exist_ok=True)
+
+        # Initialize loggers for each child account; a background thread formats and writes them
+        loggers = start_file_loggers(log_folder, [child.name for child in child_records])
+        master_account = masters[0]
+
+# Function to log messages to a specific child's log; args are formatted later, off the order path
+def log_message(child_name, message, *args):
     if child_name in loggers:
-        loggers[child_name].debug(message)
+        loggers[child_name].debug(message, *args)
+
+# Bounds for the in-memory order caches; entries expire after a trading session.
+# Expiry only frees memory: order_store stays the record of what was already copied
+CACHE_MAXSIZE = int(os.environ.get("COPY_CACHE_MAXSIZE", 50000))
+CACHE_TTL = float(os.environ.get("COPY_CACHE_TTL", 12 * 60 * 60))
 
 # Initialize mappings and processed order IDs
-order_mapping = {}  # Dictionary to store master-child order mappings
-processed_order_ids_placed = set()  # Set to store processed order IDs for placement
-processed_order_ids_canceled = set()  # Set to store processed order IDs for cancellation
+order_mapping = TTLCache(CACHE_MAXSIZE, CACHE_TTL)  # Master-child order mappings
+processed_order_ids_placed = TTLCache(CACHE_MAXSIZE, CACHE_TTL)  # Processed order IDs for placement
+processed_order_ids_canceled = TTLCache(CACHE_MAXSIZE, CACHE_TTL)  # Processed order IDs for cancellation
+
+# Reload today's state after a restart
+order_store = OrderStore()
+atexit.register(order_store.close)
+restored_mapping, restored_placed, restored_canceled, restored_terms = order_store.load()
+order_mapping.update(restored_mapping)
+for restored_order_id in restored_placed:
+    processed_order_ids_placed.add(restored_order_id)
+for restored_order_id in restored_canceled:
+    processed_order_ids_canceled.add(restored_order_id)
+print(f"Restored {len(order_mapping)} order mappings from {order_store.path}")
+
+# Function to check whether an order was already placed/canceled, asking the store once the cache let it go
+def already_processed(cache, order_id, kind):
+    if order_id in cache:
+        return True
+    if order_store.was_processed(order_id, kind):
+        cache.add(order_id)
+        return True
+    return False
+
+# Function to get the child orders of a master order, reloading them from the store after expiry
+def get_child_orders(order_id):
+    child_orders = order_mapping.get(order_id)
+    if child_orders is None:
+        child_orders = order_store.get_child_orders(order_id)
+        if child_orders:
+            order_mapping[order_id] = child_orders
+    return child_orders
+
+# Serializes order handling between the REST poll and the order-update stream
+order_processing_lock = threading.Lock()
+
+# Ingest master orders from the live order-update stream, with REST polling as fallback
+use_order_stream = os.environ.get("COPY_ORDER_STREAM", "0") == "1"
+
+# Maximum number of child orders sent at the same time (1 sends them one by one);
+# unset means one worker per child account
+max_concurrency = int(os.environ["COPY_MAX_CONCURRENCY"]) if os.environ.get("COPY_MAX_CONCURRENCY") else None
+fan_out_executor = None
+# Guards swapping the executor against a fan-out submitting to it (toggle runs on an IPC thread)
+fan_out_lock = threading.Lock()
+
+# Function to change the fan-out concurrency for the current run
+def set_max_concurrency(workers):
+    global max_concurrency, fan_out_executor
+    workers = max(1, int(workers))
+    with fan_out_lock:
+        if workers != max_concurrency and fan_out_executor is not None:
+            # Already submitted child orders still run to completion
+            fan_out_executor.shutdown(wait=False)
+            fan_out_executor = None
+        max_concurrency = workers
+
+# Function to run `func` for every child at once, returning results in child order
+def fan_out(func, children):
+    global fan_out_executor
+    with fan_out_lock:
+        workers = max_concurrency or len(child_records)
+        if workers > 1 and len(children) > 1:
+            if fan_out_executor is None:
+                fan_out_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="copy-fanout")
+            futures = [fan_out_executor.submit(func, child) for child in children]
+        else:
+            futures = None
+    if futures is None:
+        return [func(child) for child in children]
+    return [future.result() for future in futures]
 
 # Function to fetch master orders
+# The fetch goes through the shared bus so the dashboard reuses it instead of polling the master again
 def fetch_master_orders(access_token):
-    url = "https://api.dhan.co/v2/orders"
-    headers = {"Content-Type": "application/json", "access-token": access_token}
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        orders = response.json()
-        return orders
-    else:
-        print("Failed to fetch master orders:", response.text)
-        return []
+    orders = bus.get(ORDERS, access_token)
+    if orders is None:
+        print("Failed to fetch master orders")
+    return orders
 
 # Function to place orders in child accounts
 def place_order(access_token, client_id, order_details, child_name):
-    url = "https://api.dhan.co/v2/orders"
-    headers = {"Content-Type": "application/json", "access-token": access_token}
+    url = f"{API_BASE_URL}/orders"
     order_details["dhanClientId"] = client_id
-    log_message(child_name, f"Placing order with details: {order_details}")
-    response = requests.post(url, headers=headers, json=order_details)
+    log_message(child_name, "Placing order with details: %s", order_details)
+    started = time.perf_counter()
+    response = get_session(access_token).post(url, json=order_details, timeout=REQUEST_TIMEOUT)
+    latency.record(latency.ACK, child_name, time.perf_counter() - started)
     if response.status_code == 200:
         order_id = response.json().get("orderId")
-        log_message(child_name, f"Order placed successfully with ID {order_id}")
+        log_message(child_name, "Order placed successfully with ID %s", order_id)
         return order_id
     else:
-        log_message(child_name, f"Failed to place order: {response.text}")
+        log_message(child_name, "Failed to place order: %s", response.text)
         return None
 
 # Function to cancel an order in child accounts
 def cancel_order(access_token, order_id, child_name):
-    url = f"https://api.dhan.co/v2/orders/{order_id}"
-    headers = {"Content-Type": "application/json", "access-token": access_token}
-    log_message(child_name, f"Cancelling Order {order_id}")
-    response = requests.delete(url, headers=headers)
+    url = f"{API_BASE_URL}/orders/{order_id}"
+    log_message(child_name, "Cancelling Order %s", order_id)
+    started = time.perf_counter()
+    response = get_session(access_token).delete(url, timeout=REQUEST_TIMEOUT)
+    latency.record(latency.CANCEL_ACK, child_name, time.perf_counter() - started)
+    if response.status_code == 200:
+        log_message(child_name, "Order %s canceled successfully.", order_id)
+    else:
+        log_message(child_name, "Failed to cancel order %s: %s", order_id, response.text)
+
+# Function to modify an order in child accounts
+def modify_order(access_token, client_id, order_id, modify_details, child_name):
+    url = f"{API_BASE_URL}/orders/{order_id}"
+    modify_details["dhanClientId"] = client_id
+    log_message(child_name, "Modifying Order %s with details: %s", order_id, modify_details)
+    started = time.perf_counter()
+    response = get_session(access_token).put(url, json=modify_details, timeout=REQUEST_TIMEOUT)
+    latency.record(latency.MODIFY_ACK, child_name, time.perf_counter() - started)
     if response.status_code == 200:
-        log_message(child_name, f"Order {order_id} canceled successfully.")
+        log_message(child_name, "Order %s modified successfully.", order_id)
     else:
-        log_message(child_name, f"Failed to cancel order {order_id}: {response.text}")
+        log_message(child_name, "Failed to modify order %s: %s", order_id, response.text)
 
 # Function to convert `updateTime` to a timestamp
 def convert_update_time(update_time_str):
@@ -120,83 +217,242 @@ def convert_update_time(update_time_str):
         print(f"Invalid updateTime format: {update_time_str}")
         return None
 
-# Function to process a single order based on its status
-def process_order(order):
-    global order_mapping, processed_order_ids_placed, processed_order_ids_canceled
+# Orders already in the master book at startup are only copied if this fresh (seconds)
+STARTUP_FRESH_WINDOW = 5
+
+# Function to check whether an order was updated within the startup window
+def is_fresh_order(order):
+    update_time_str = order.get("updateTime")
+    update_time = convert_update_time(update_time_str) if update_time_str else None
+    return update_time is not None and int(time.time()) - update_time <= STARTUP_FRESH_WINDOW
+
+# Last seen state of every master order, used to act only on real transitions
+order_book = OrderBookDiff(is_fresh=is_fresh_order, last_seen=TTLCache(CACHE_MAXSIZE, CACHE_TTL))
+
+# Statuses in which a copied master order can still be modified
+MODIFIABLE_STATUSES = ("PENDING", "PART_TRADED")
 
+# Terms last sent to the children for each copied master order; persisted so that after a restart an
+# unchanged order (e.g. PENDING -> PART_TRADED) is not re-sent to every child
+copied_order_terms = TTLCache(CACHE_MAXSIZE, CACHE_TTL)
+copied_order_terms.update(restored_terms)
+
+# Function to extract the order terms a modification can change
+def order_terms(order):
+    return (order.get("orderType"), order.get("quantity"), order.get("price"), order.get("triggerPrice"))
+
+# Function to get the terms last sent for a master order, reloading them from the store after expiry
+def get_copied_terms(order_id):
+    terms = copied_order_terms.get(order_id)
+    if terms is None:
+        terms = order_store.get_terms(order_id)
+        if terms is not None:
+            copied_order_terms[order_id] = terms
+    return terms
+
+# Function to record the terms sent to the children of a master order
+def record_copied_terms(order_id, terms):
+    copied_order_terms[order_id] = terms
+    order_store.record_terms(order_id, terms)
+
+# Function to push a master modification to every mapped child order concurrently
+def propagate_modification(order):
     order_id = order.get("orderId")
+    terms = order_terms(order)
+    if get_copied_terms(order_id) == terms:
+        return
+    child_orders = get_child_orders(order_id)
+    if not child_orders:
+        return
+    print(f"Modifying Order {order_id} to {terms}")
+    quantity = int(order["quantity"])
+
+    def modify_for_child(child):
+        child_order_id = child_orders.get(child.client_id)
+        if child_order_id:
+            modify_details = {
+                "orderId": child_order_id,
+                "orderType": order["orderType"],
+                "quantity": quantity * child.multiplier,
+                "price": order.get("price", ""),
+                "disclosedQuantity": 0,
+                "triggerPrice": order.get("triggerPrice", ""),
+                "validity": order["validity"]
+            }
+            if order.get("legName"):
+                modify_details["legName"] = order["legName"]
+            try:
+                modify_order(child.access_token, child.client_id, child_order_id, modify_details, child.name)
+            except Exception as e:
+                log_message(child.name, "Error modifying order %s: %s", child_order_id, e)
+
+    fan_out(modify_for_child, child_records)
+    record_copied_terms(order_id, terms)
+
+# Function to report hit/miss/eviction counters of the order caches
+def cache_stats():
+    return {
+        "order_mapping": order_mapping.stats(),
+        "processed_order_ids_placed": processed_order_ids_placed.stats(),
+        "processed_order_ids_canceled": processed_order_ids_canceled.stats(),
+        "order_book": order_book.last_seen.stats(),
+        "copied_order_terms": copied_order_terms.stats(),
+    }
+
+# Function to record how long after the master's updateTime an order was detected
+def record_detection(order, stage):
     update_time_str = order.get("updateTime")
+    update_time = convert_update_time(update_time_str) if update_time_str else None
+    # updateTime has one-second resolution, so this stage is accurate to about a second
+    if update_time is not None:
+        latency.record(stage, "master", time.time() - update_time)
+
+# Tag on every child order this engine places, so its own copies can be recognised
+COPY_CORRELATION_PREFIX = "copy_"
+
+# Function to process a single changed order based on its status and transition
+def process_order(order, event=None, source=latency.DETECT_POLL):
+    global order_mapping, processed_order_ids_placed, processed_order_ids_canceled
+
+    detected_at = time.perf_counter()
+    record_detection(order, source)
+    order_id = order.get("orderId")
     order_status = order.get("orderStatus")
     order_type = order.get("orderType")  # Get the order type
 
-    # Convert `updateTime` to a timestamp
-    update_time = convert_update_time(update_time_str) if update_time_str else None
-
-    if not update_time:
-        print(f"Order {order_id} has no valid updateTime. Skipping...")
+    # Modifications of an already copied, still open order are propagated in place
+    if event == MODIFIED and order_status in MODIFIABLE_STATUSES \
+            and already_processed(processed_order_ids_placed, order_id, "placed"):
+        propagate_modification(order)
         return
 
-    # Check timing for placement or cancellation separately
-    current_time = int(time.time())
-
     # Process market orders or pending orders
     if order_type == "MARKET" or order_status == "PENDING" or order_status == "TRADED":
-        if order_id in processed_order_ids_placed or current_time - update_time > 5:
+        if already_processed(processed_order_ids_placed, order_id, "placed"):
             return
         print(f"Placing Order {order_id} with status {order_status} and type {order_type}")
 
-        # Place orders in child accounts
-        for _, child in child_accounts.iterrows():
-            multiplier = child['Multiplier']
-            child_order_details = {
-                "dhanClientId": child['client_id'],
-                "correlationId": f"copy_{order_id}",
-                "transactionType": order["transactionType"],
-                "exchangeSegment": order["exchangeSegment"],
-                "productType": order["productType"],
-                "orderType": "MARKET" if order_type == "MARKET" else order["orderType"],
-                "validity": order["validity"],
-                "securityId": order["securityId"],
-                "quantity": int(order["quantity"]) * multiplier,
-                "price": order.get("price", ""),
-                "triggerPrice": order.get("triggerPrice", "")
-            }
-            child_order_id = place_order(child['access_token'], child['client_id'], child_order_details, child['name'])
+        # Fields shared by every child's copy of this order
+        base_order_details = {
+            "correlationId": f"{COPY_CORRELATION_PREFIX}{order_id}",
+            "transactionType": order["transactionType"],
+            "exchangeSegment": order["exchangeSegment"],
+            "productType": order["productType"],
+            "orderType": "MARKET" if order_type == "MARKET" else order["orderType"],
+            "validity": order["validity"],
+            "securityId": order["securityId"],
+            "price": order.get("price", ""),
+            "triggerPrice": order.get("triggerPrice", "")
+        }
+        quantity = int(order["quantity"])
+
+        # Place orders in all child accounts concurrently
+        def copy_to_child(child):
+            build_started = time.perf_counter()
+            child_order_details = child.build_order(base_order_details, quantity)
+            send_started = time.perf_counter()
+            latency.record(latency.BUILD, child.name, send_started - build_started)
+            latency.record(latency.SEND, child.name, send_started - detected_at)
+            try:
+                child_order_id = place_order(child.access_token, child.client_id, child_order_details, child.name)
+            except Exception as e:
+                log_message(child.name, "Error placing order: %s", e)
+                return None
+            latency.record(latency.TOTAL, child.name, time.perf_counter() - detected_at)
+            return child_order_id
+
+        for child, child_order_id in zip(child_records, fan_out(copy_to_child, child_records)):
             if child_order_id:
-                order_mapping.setdefault(order_id, {})[child['client_id']] = child_order_id
+                order_mapping.setdefault(order_id, {})[child.client_id] = child_order_id
+                order_store.record_mapping(order_id, child.client_id, child_order_id)
             else:
-                log_message(child['name'], f"Order copy failed.")
+                log_message(child.name, "Order copy failed.")
         processed_order_ids_placed.add(order_id)
+        record_copied_terms(order_id, order_terms(order))
+        order_store.record_processed(order_id, "placed")
 
     elif order_status == "CANCELLED":
-        if order_id in processed_order_ids_canceled or current_time - update_time > 5:
+        if already_processed(processed_order_ids_canceled, order_id, "canceled"):
             return
         print(f"Cancelling Order {order_id} with status {order_status}")
 
-        # Cancel orders in child accounts
-        if order_id in order_mapping:
-            for _, child in child_accounts.iterrows():
-                child_id = child['client_id']
-                child_order_id = order_mapping[order_id].get(child_id)
+        # Cancel orders in all child accounts concurrently
+        child_orders = get_child_orders(order_id)
+        if child_orders:
+            def cancel_for_child(child):
+                child_order_id = child_orders.get(child.client_id)
                 if child_order_id:
-                    cancel_order(child['access_token'], child_order_id, child['name'])
+                    try:
+                        cancel_order(child.access_token, child_order_id, child.name)
+                    except Exception as e:
+                        log_message(child.name, "Error cancelling order %s: %s", child_order_id, e)
+
+            fan_out(cancel_for_child, child_records)
         processed_order_ids_canceled.add(order_id)
+        order_store.record_processed(order_id, "canceled")
+
+# Function to handle one master order pushed by the stream
+def handle_order_update(order):
+    # The feed may also carry other accounts' orders, including the copies placed by this engine
+    client_id = order.get("dhanClientId")
+    if client_id is not None and str(client_id) != str(master_account['client_id']):
+        return
+    if str(order.get("correlationId") or "").startswith(COPY_CORRELATION_PREFIX):
+        return
+    with order_processing_lock:
+        event = order_book.apply(order)
+        if event:
+            process_order(order, event, latency.DETECT_STREAM)
+
+# Optional OrderRecorder capturing every changed master order book (see order_replay.py)
+order_recorder = None
 
 # Function to synchronize orders between master and child accounts
-def synchronize_orders():
-    master_orders = fetch_master_orders(master_account['access_token'])
-    for order in master_orders:
-        process_order(order)
+def synchronize_orders(master_orders=None):
+    load_accounts()
+    # Replays pass a recorded order book instead of polling the master
+    if master_orders is None:
+        master_orders = fetch_master_orders(master_account['access_token'])
+        if master_orders is None:
+            return
+        if order_recorder is not None:
+            order_recorder.record(master_orders)
+    with order_processing_lock:
+        for event, order in order_book.diff(master_orders):
+            process_order(order, event)
+
+# Function to start the master's order-update stream
+def start_order_stream():
+    load_accounts()
+    return OrderUpdateStream(master_account['client_id'], master_account['access_token'], handle_order_update).start()
 
 # Main function
-def main():
+def main(max_concurrency=None, use_stream=None, record_path=None):
+    global order_recorder
+    load_accounts()
+    if max_concurrency is not None:
+        set_max_concurrency(max_concurrency)
+    if record_path:
+        from order_replay import OrderRecorder
+        order_recorder = OrderRecorder(record_path)
+    stream = start_order_stream() if (use_order_stream if use_stream is None else use_stream) else None
     while True:
         try:
-            synchronize_orders()
+            # With a healthy stream the REST poll only fills gaps
+            if stream is None or stream.should_poll():
+                synchronize_orders()
             time.sleep(1)  # Minimum refresh time
         except Exception as e:
             print("Error in synchronization:", str(e))
 
 # Run the script
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Copy master orders to child accounts")
+    parser.add_argument("--max-concurrency", type=int, default=None,
+                        help="Maximum number of child orders sent at the same time")
+    parser.add_argument("--stream", action="store_true", default=None,
+                        help="Ingest master orders from the order-update WebSocket, polling only as fallback")
+    parser.add_argument("--record", metavar="PATH", default=None,
+                        help="Also record every changed master order book to PATH for order_replay.py")
+    args = parser.parse_args()
+    main(args.max_concurrency, args.stream, args.record)
@@ -0,0 +1,81 @@
+import os
+import json
+import hashlib
+import logging
+from dhan_session import get_session
+
+# Parsed rosters are cached next to the workbook as <file>.cache.json
+ROSTER_CACHE_SUFFIX = ".cache.json"
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Function to read a roster workbook as row dicts; Excel is only parsed when the file's mtime and hash both changed
+def load_roster(path):
+    stat = os.stat(path)
+    cache_path = path + ROSTER_CACHE_SUFFIX
+    try:
+        with open(cache_path) as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        cache = {}
+    if cache.get("mtime_ns") == stat.st_mtime_ns and cache.get("size") == stat.st_size:
+        return cache["rows"]
+    # A touched but identical file (e.g. re-copied on deploy) keeps its cached rows
+    digest = file_digest(path)
+    if cache.get("sha256") == digest:
+        rows = cache["rows"]
+    else:
+        import pandas as pd
+        rows = pd.read_excel(path).to_dict("records")
+    # The sidecar only saves the next parse; failing to write it must not lose the rows just read
+    try:
+        write_roster_cache(cache_path, {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": digest, "rows": rows})
+    except OSError as e:
+        logging.warning("Could not write roster cache %s: %s", cache_path, str(e))
+    return rows
+
+def write_roster_cache(cache_path, cache):
+    # Holds the same tokens as the workbook, so it is written owner-only and swapped in atomically
+    temporary_path = cache_path + ".tmp"
+    descriptor = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, "w") as file:
+        json.dump(cache, file, default=str)
+    os.replace(temporary_path, cache_path)
+
+# Compact child-account record used on the copy hot path
+class ChildAccount:
+    __slots__ = ("name", "client_id", "access_token", "multiplier", "payload_template")
+
+    def __init__(self, name, client_id, access_token, multiplier):
+        self.name = name
+        self.client_id = client_id
+        self.access_token = access_token
+        self.multiplier = multiplier
+        # Per-child fields every copied order starts from
+        self.payload_template = {"dhanClientId": client_id}
+
+    # Function to build this child's order from the fields shared by all children
+    def build_order(self, base_order_details, quantity):
+        order_details = self.payload_template.copy()
+        order_details.update(base_order_details)
+        order_details["quantity"] = quantity * self.multiplier
+        return order_details
+
+    def __repr__(self):
+        return f"ChildAccount(name={self.name!r}, client_id={self.client_id!r}, multiplier={self.multiplier!r})"
+
+# Function to turn the child rows of the account sheet (row dicts or a DataFrame) into ChildAccount records
+def build_child_records(child_accounts):
+    if hasattr(child_accounts, "to_dict"):
+        child_accounts = child_accounts.to_dict("records")
+    records = []
+    for row in child_accounts:
+        records.append(ChildAccount(row['name'], row['client_id'], row['access_token'], row['Multiplier']))
+        # Warm the pooled session so its headers are ready before the first order
+        get_session(row['access_token'])
+    return tuple(records)
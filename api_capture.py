@@ -0,0 +1,98 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+
+# Fraction of successful responses captured in full (errors are always captured while the budget lasts)
+CAPTURE_SAMPLE_RATE = float(os.environ.get("API_CAPTURE_SAMPLE_RATE", 0.0))
+# Bytes of captured payloads allowed per interval, and the largest single payload kept
+CAPTURE_BUDGET_BYTES = int(os.environ.get("API_CAPTURE_BUDGET_BYTES", 256 * 1024))
+CAPTURE_MAX_PAYLOAD = int(os.environ.get("API_CAPTURE_MAX_PAYLOAD", 64 * 1024))
+# Seconds per summary line and per budget window
+CAPTURE_INTERVAL = float(os.environ.get("API_CAPTURE_INTERVAL", 60))
+# Optional JSON-lines file for captured payloads; otherwise they go to the normal log
+CAPTURE_FILE = os.environ.get("API_CAPTURE_FILE")
+
+capture_logger = logging.getLogger("api_capture")
+if CAPTURE_FILE:
+    capture_handler = logging.FileHandler(CAPTURE_FILE)
+    capture_handler.setFormatter(logging.Formatter("%(message)s"))
+    capture_logger.addHandler(capture_handler)
+    capture_logger.propagate = False
+
+# Function to identify an account in logs without writing its access token
+def redact(access_token):
+    return "..." + str(access_token)[-4:]
+
+# Per-feed totals for one summary interval
+class FeedWindow:
+    __slots__ = ("fetches", "errors", "items", "bytes", "seconds", "max_seconds")
+
+    def __init__(self):
+        self.fetches = self.errors = self.items = self.bytes = 0
+        self.seconds = self.max_seconds = 0.0
+
+# Summarizes every API response and keeps full payloads only for errors or samples, within a byte budget
+class ResponseCapture:
+    def __init__(self, sample_rate=CAPTURE_SAMPLE_RATE, budget_bytes=CAPTURE_BUDGET_BYTES,
+                 max_payload=CAPTURE_MAX_PAYLOAD, interval=CAPTURE_INTERVAL, timer=time.monotonic):
+        self.sample_rate = sample_rate
+        self.budget_bytes = budget_bytes
+        self.max_payload = max_payload
+        self.interval = interval
+        self.timer = timer
+        self.lock = threading.Lock()
+        self.start_window(timer())
+
+    def start_window(self, now):
+        self.window_started = now
+        self.windows = {}
+        self.captured = 0
+        self.captured_bytes = 0
+        self.dropped = 0
+
+    # Function to record one response; items is None when the response was an error or unparseable
+    def record(self, feed, access_token, status, body, seconds, items=None):
+        error = items is None
+        with self.lock:
+            now = self.timer()
+            if now - self.window_started >= self.interval:
+                self.log_summary(now)
+                self.start_window(now)
+            window = self.windows.get(feed)
+            if window is None:
+                window = self.windows[feed] = FeedWindow()
+            window.fetches += 1
+            window.errors += error
+            window.items += items or 0
+            window.bytes += len(body)
+            window.seconds += seconds
+            window.max_seconds = max(window.max_seconds, seconds)
+            if not error and (self.sample_rate <= 0 or random.random() >= self.sample_rate):
+                return
+            payload = body[:self.max_payload]
+            if self.captured_bytes + len(payload) > self.budget_bytes:
+                self.dropped += 1
+                return
+            self.captured += 1
+            self.captured_bytes += len(payload)
+        capture_logger.info(json.dumps({
+            "ts": time.time(), "feed": feed, "account": redact(access_token), "status": status,
+            "reason": "error" if error else "sample", "bytes": len(body), "ms": round(seconds * 1000, 1),
+            "truncated": len(payload) < len(body), "body": payload.decode("utf-8", "replace"),
+        }))
+
+    def log_summary(self, now):
+        elapsed = now - self.window_started
+        for feed, window in self.windows.items():
+            logging.info("API %s over %.0fs: %d fetches, %d items, %.1f KB, avg %.1f ms, max %.1f ms, %d errors",
+                         feed, elapsed, window.fetches, window.items, window.bytes / 1024,
+                         window.seconds / window.fetches * 1000, window.max_seconds * 1000, window.errors)
+        if self.captured or self.dropped:
+            logging.info("API payload capture: %d kept (%.1f KB), %d dropped over the %d-byte budget",
+                         self.captured, self.captured_bytes / 1024, self.dropped, self.budget_bytes)
+
+# Process-wide capture used by the order bus
+capture = ResponseCapture()
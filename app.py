@@ -1,15 +1,20 @@
-import pandas as pd
-import json
 import time
 import threading
 import os
+import fcntl
 import logging
-from flask import Flask, render_template, jsonify, request
-from flask_socketio import SocketIO
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, render_template, jsonify, request
+from flask_socketio import SocketIO, emit
 from flask_cors import CORS
-from dhanhq import dhanhq
 from datetime import datetime
-from Copy_Trading_19_12_24 import synchronize_orders
+from order_bus import bus, ORDERS, POSITIONS
+from versioned_snapshot import VersionedSnapshot, encode
+from ttl_cache import TTLCache
+from accounts import load_roster
+from copy_engine_service import EngineClient, EngineSupervisor
+from rate_limiter import set_read_share, DASHBOARD_READ_SHARE
 
 # Logging Configuration
 logging.basicConfig(
@@ -18,164 +23,405 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()]
 )
 
-# Load client credentials
+# Accounts polled at the same time by each of fetch_orders/fetch_positions; unset means every client at once
+FETCH_MAX_WORKERS = int(os.environ["DASHBOARD_FETCH_WORKERS"]) if os.environ.get("DASHBOARD_FETCH_WORKERS") else None
+
+# Function to build one poller's own pool, so the orders and positions loops never queue behind each other
+def fetch_pool(feed):
+    return ThreadPoolExecutor(max_workers=FETCH_MAX_WORKERS or max(1, len(clients)),
+                              thread_name_prefix=f"dashboard-{feed}")
+
+# Dashboard refresh period, and how old a bus fetch (e.g. the copy engine's 1s master poll) may be to reuse it
+REFRESH_INTERVAL = 5
+SHARED_MAX_AGE = float(os.environ.get("DASHBOARD_SHARED_MAX_AGE", 2.0))
+
+# Client credentials, filled by load_clients() when the pollers start rather than at import
+CLIENTS_FILE = "clients.xlsx"
+clients = {}
+client_names = {}
+
+# Load client credentials; the parsed sheet is cached until clients.xlsx changes
 def load_clients():
+    global clients, client_names
     try:
-        df = pd.read_excel("clients.xlsx")
-        df.columns = df.columns.str.strip().str.lower()
-        if {"name", "client_id", "access_token"} - set(df.columns):
+        rows = [{str(column).strip().lower(): value for column, value in row.items()}
+                for row in load_roster(os.path.join(os.getcwd(), CLIENTS_FILE))]
+        if rows and {"name", "client_id", "access_token"} - set(rows[0]):
             raise ValueError("Excel file must contain 'name', 'client_id', and 'access_token' columns.")
-        
-        clients = {row["name"]: {"client_id": row["client_id"], "access_token": row["access_token"]} for _, row in df.iterrows()}
-        logging.info("Loaded client credentials: %s", clients)
-        return clients
+
+        clients = {row["name"]: {"client_id": row["client_id"], "access_token": row["access_token"]} for row in rows}
+        logging.info("Loaded credentials for %d clients", len(clients))
     except Exception as e:
         logging.error("Error loading client credentials: %s", str(e))
-        return {}
+        clients = {}
+    client_names = {creds["access_token"]: name for name, creds in clients.items()}
+    return clients
 
-clients = load_clients()
+# Flattened rows per client, rebuilt once per bus fetch whoever triggered it
+client_order_rows = {}
+client_position_rows = {}
 
 app = Flask(__name__)
 CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Threading mode serves WebSocket upgrades through simple-websocket under gunicorn's gthread worker
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode="threading")
 
 categorized_orders = {"pending": [], "traded": [], "rejected": [], "cancelled": [], "others": []}
 categorized_positions = {"open": [], "closed": []}
 
-copy_trading_enabled = False
-copy_trading_running = False
+# Versioned copies of the categorized rows; Socket.IO sends only their deltas.
+# Orders are keyed by order_id, positions by "name|product_type|symbol" (a symbol can be held in several products).
+snapshots = {
+    "orders": VersionedSnapshot(categorized_orders, key=lambda row: row["order_id"],
+                                indexed=("name", "symbol", "status", "transaction_type")),
+    "positions": VersionedSnapshot(categorized_positions,
+                                   key=lambda row: f"{row['name']}|{row['product_type']}|{row['symbol']}",
+                                   indexed=("name", "symbol", "product_type", "transaction_type")),
+}
+
+# Query parameters of /get_orders and /get_positions that filter on an indexed field
+# (clients/symbols are named as in /get_snapshot)
+QUERY_FILTERS = {"clients": "name", "symbols": "symbol", "status": "status", "product_type": "product_type",
+                 "transaction_type": "transaction_type", "category": "category"}
+ORDER_SORT_FIELDS = ("name", "symbol", "transaction_type", "quantity", "price", "status", "order_id")
+POSITION_SORT_FIELDS = ("name", "symbol", "product_type", "quantity", "buy_avg", "sell_avg", "net_profit",
+                        "transaction_type")
+PAGE_SIZE = 200
+MAX_PAGE_SIZE = 2000
+# Any of these switches a request to the paged query shape; others (e.g. jQuery's "_" cache-buster) do not
+QUERY_PARAMS = frozenset(QUERY_FILTERS) | {"sort", "limit", "cursor"}
+
+# The copy engine runs in its own process (started by the poller owner) and is reached over a Unix socket
+copy_engine = EngineClient()
+# Its limiters are separate from this process's, so the dashboard keeps to its share of each account's reads
+set_read_share(DASHBOARD_READ_SHARE)
+engine_supervisor = EngineSupervisor()
+
+# Reuse the engine's master polls in the dashboard; a short timeout keeps a stuck engine from stalling the pollers.
+# Lookups use their own connection so they never queue behind dashboard commands on copy_engine.
+PEER_TIMEOUT = 0.2
+engine_peer = EngineClient()
+# (feed, access token) pairs the engine polls, refreshed now and then in case the engine restarts
+engine_feeds = TTLCache(maxsize=1, ttl=60)
+
+# Function to ask the engine for a recent fetch, only for the feeds it actually polls (the master's orders)
+def ask_engine(feed, access_token, max_age):
+    feeds = engine_feeds.get("feeds")
+    if feeds is None:
+        try:
+            feeds = {tuple(key) for key in engine_peer.call("polled_feeds", timeout=PEER_TIMEOUT)}
+        except (ConnectionError, RuntimeError):
+            # Engine down: fetch everything locally until the next refresh instead of retrying per fetch
+            feeds = set()
+        engine_feeds["feeds"] = feeds
+    if (feed, access_token) not in feeds:
+        return None
+    return engine_peer.call("shared", timeout=PEER_TIMEOUT, feed=feed, access_token=access_token, max_age=max_age)
+
+bus.peer = ask_engine
 
-def run_copy_trading():
-    global copy_trading_running
-    copy_trading_running = True
-    logging.info("Copy Trading function started.")
+# Function to answer a route from the copy engine, or 503 if it is unreachable
+def engine_response(command, **kwargs):
     try:
-        while copy_trading_enabled:
-            synchronize_orders()
-            time.sleep(1)
-    except Exception as e:
-        logging.error("Error in Copy Trading: %s", str(e))
-    finally:
-        logging.info("Copy Trading function stopped.")
-        copy_trading_running = False
+        return jsonify(copy_engine.call(command, **kwargs))
+    except (ConnectionError, RuntimeError) as e:
+        logging.error("Copy engine %s failed: %s", command, str(e))
+        return jsonify({"error": str(e)}), 503
 
 @app.route("/")
 def index():
     return render_template("index.html")
 
+# /get_snapshot bodies per (query, snapshot versions), so repeated ticks from open tabs serialize nothing
+snapshot_bodies = TTLCache(maxsize=256, ttl=300)
+SNAPSHOT_QUERY = ("orders", "positions", "order_fields", "position_fields", "clients", "symbols")
+
+# Function to serve pre-encoded bytes, with 304 for unchanged polls and gzip when accepted.
+# Each content coding is a different representation, so the gzip body gets its own strong ETag
+def encoded_response(etag, body, gzipped):
+    use_gzip = bool(request.accept_encodings["gzip"])
+    if use_gzip:
+        etag += "-gz"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    elif use_gzip:
+        response = Response(gzipped, mimetype="application/json")
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+def snapshot_response(snapshot):
+    return encoded_response(*snapshot.encoded())
+
+# Function to read a comma-separated query parameter; None when absent so the default is "everything"
+def query_list(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    return tuple(item for item in value.split(",") if item)
+
+# Function to answer a filtered/sorted/paged query, e.g. ?clients=A,B&status=traded&sort=-price&limit=100&cursor=...
+def query_response(snapshot, sort_fields):
+    filters = {}
+    for param, field in QUERY_FILTERS.items():
+        values = query_list(param)
+        if values is None:
+            continue
+        if field not in snapshot.indexed:
+            return jsonify({"error": f"Cannot filter by {param}"}), 400
+        filters[field] = values
+    sort = request.args.get("sort") or None
+    descending = sort is not None and sort.startswith("-")
+    if descending:
+        sort = sort[1:]
+    if sort is not None and sort not in sort_fields:
+        return jsonify({"error": f"Cannot sort by {sort}"}), 400
+    try:
+        limit = min(MAX_PAGE_SIZE, max(1, int(request.args.get("limit", PAGE_SIZE))))
+        rows, next_cursor, total = snapshot.query(filters, sort, descending, request.args.get("cursor"), limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return encoded_response(*encode({"version": snapshot.version, "total": total,
+                                     "rows": rows, "next_cursor": next_cursor}))
+
+# Function to tell whether a request asks for the paged query shape
+def is_query_request():
+    return not QUERY_PARAMS.isdisjoint(request.args)
+
+# Without filter, sort, limit or cursor parameters these return the full categorized snapshot
 @app.route("/get_orders")
 def get_orders():
-    return jsonify(categorized_orders)
+    if is_query_request():
+        return query_response(snapshots["orders"], ORDER_SORT_FIELDS)
+    return snapshot_response(snapshots["orders"])
 
 @app.route("/get_positions")
 def get_positions():
-    return jsonify(categorized_positions)
+    if is_query_request():
+        return query_response(snapshots["positions"], POSITION_SORT_FIELDS)
+    return snapshot_response(snapshots["positions"])
+
+# Orders and positions in one response, e.g.
+# /get_snapshot?orders=pending,traded&positions=open&order_fields=name,symbol,status&clients=A,B&symbols=SBIN-EQ
+@app.route("/get_snapshot")
+def get_snapshot():
+    query = {name: query_list(name) for name in SNAPSHOT_QUERY}
+    versions = {feed: snapshot.version for feed, snapshot in snapshots.items()}
+    key = (tuple(query.values()), tuple(versions.values()))
+    encoded = snapshot_bodies.get(key)
+    if encoded is None:
+        clients_filter = None if query["clients"] is None else set(query["clients"])
+        symbols_filter = None if query["symbols"] is None else set(query["symbols"])
+        data = {"versions": versions}
+        for feed, fields in (("orders", query["order_fields"]), ("positions", query["position_fields"])):
+            data[feed] = snapshots[feed].select(query[feed], fields, clients_filter, symbols_filter)
+        encoded = encode(data)
+        snapshot_bodies[key] = encoded
+    return encoded_response(*encoded)
 
 @app.route("/toggle_copy_trading", methods=["POST"])
 def toggle_copy_trading():
-    global copy_trading_enabled
     data = request.json
-    copy_trading_enabled = data.get("enabled", False)
-    message = "Copy Trading Enabled" if copy_trading_enabled else "Copy Trading Disabled"
+    enabled = bool(data.get("enabled", False))
+    max_concurrency = data.get("max_concurrency")
+    if max_concurrency is not None:
+        try:
+            max_concurrency = int(max_concurrency)
+        except (TypeError, ValueError):
+            max_concurrency = 0
+        if max_concurrency < 1:
+            return jsonify({"message": "max_concurrency must be a positive integer"}), 400
+    try:
+        copy_engine.call("toggle", enabled=enabled, max_concurrency=max_concurrency)
+    except (ConnectionError, RuntimeError) as e:
+        logging.error("Failed to toggle Copy Trading: %s", str(e))
+        return jsonify({"message": f"Copy engine unavailable: {e}"}), 503
+    message = "Copy Trading Enabled" if enabled else "Copy Trading Disabled"
     logging.info(message)
 
-    if copy_trading_enabled:
-        threading.Thread(target=run_copy_trading, daemon=True).start()
-
     return jsonify({"message": message})
 
 @app.route("/get_copy_trading_status")
 def get_copy_trading_status():
-    status = "Running" if copy_trading_running else "Stopped"
+    try:
+        status = "Running" if copy_engine.call("status")["running"] else "Stopped"
+    except (ConnectionError, RuntimeError):
+        status = "Unavailable"
     return jsonify({"status": status})
 
+@app.route("/get_copy_trading_cache_stats")
+def get_copy_trading_cache_stats():
+    return engine_response("cache_stats")
+
+@app.route("/get_copy_latency")
+def get_copy_latency():
+    return engine_response("latency")
+
+@app.route("/get_bus_stats")
+def get_bus_stats():
+    return jsonify(bus.stats())
+
+# New Socket.IO clients start from the full snapshots and then apply deltas
+@socketio.on("connect")
+def on_connect():
+    for feed, snapshot in snapshots.items():
+        emit(f"{feed}_snapshot", snapshot.full())
+
+# Clients that missed a delta (version gap) send {"feed", "version"} and get the missing deltas or a full snapshot
+@socketio.on("resync")
+def on_resync(message):
+    snapshot = snapshots.get(message.get("feed"))
+    if snapshot is None:
+        return
+    deltas = snapshot.since(message.get("version"))
+    if deltas is None:
+        emit(f"{message['feed']}_snapshot", snapshot.full())
+        return
+    for delta in deltas:
+        emit(f"{message['feed']}_delta", delta)
+
+# Function to flatten one account's orders when the bus publishes them
+def on_orders(access_token, orders):
+    client_name = client_names.get(access_token)
+    if client_name is None:
+        return
+    client_order_rows[client_name] = [{
+        "name": client_name,
+        "symbol": order.get("tradingSymbol", "N/A"),
+        "transaction_type": order.get("transactionType", "N/A"),
+        "quantity": order.get("quantity", 0),
+        "price": order.get("price", 0.0),
+        "status": order.get("orderStatus", "UNKNOWN"),
+        "order_id": order.get("orderId", "N/A")
+    } for order in orders]
+
+bus.subscribe(ORDERS, on_orders)
+
+# Function to fetch one client's orders, reusing a recent fetch from the copy engine
+def fetch_client_orders(client_name, creds):
+    try:
+        orders = bus.get(ORDERS, creds["access_token"], max_age=SHARED_MAX_AGE)
+        # Response sizes and latency are summarized by api_capture; failed payloads are captured there
+        if orders is None:
+            logging.warning("No data returned for orders of %s", client_name)
+            return []
+    except Exception as e:
+        logging.error("Error fetching orders for %s: %s", client_name, str(e))
+        return []
+    return client_order_rows.get(client_name, [])
+
 def fetch_orders():
     global categorized_orders
+    fetch_executor = fetch_pool(ORDERS)
     while True:
         updated_orders = {key: [] for key in categorized_orders}
-        for client_name, creds in clients.items():
-            try:
-                dhan = dhanhq(creds["client_id"], creds["access_token"])
-                response = dhan.get_order_list()
-                
-                # Debugging API Response
-                logging.info("API Response for orders (%s): %s", client_name, response)
-
-                if isinstance(response, str):
-                    response = json.loads(response)
-
-                if "data" in response and isinstance(response["data"], list):
-                    for order in response["data"]:
-                        order_data = {
-                            "name": client_name,
-                            "symbol": order.get("tradingSymbol", "N/A"),
-                            "transaction_type": order.get("transactionType", "N/A"),
-                            "quantity": order.get("quantity", 0),
-                            "price": order.get("price", 0.0),
-                            "status": order.get("orderStatus", "UNKNOWN"),
-                            "order_id": order.get("orderId", "N/A")
-                        }
-                        status = order_data["status"].lower()
-                        if status in updated_orders:
-                            updated_orders[status].append(order_data)
-                        else:
-                            updated_orders["others"].append(order_data)
+        # Poll every client at once; results come back in client order
+        results = fetch_executor.map(fetch_client_orders, list(clients), list(clients.values()))
+        for client_orders in results:
+            for order_data in client_orders:
+                status = order_data["status"].lower()
+                if status in updated_orders:
+                    updated_orders[status].append(order_data)
                 else:
-                    logging.warning("No data returned for orders of %s", client_name)
+                    updated_orders["others"].append(order_data)
 
-            except Exception as e:
-                logging.error("Error fetching orders for %s: %s", client_name, str(e))
-        
         categorized_orders = updated_orders
-        socketio.emit("update_orders", categorized_orders)
-        time.sleep(5)  # Adding delay to avoid API rate limits
+        delta = snapshots["orders"].publish(updated_orders)
+        if delta is not None:
+            socketio.emit("orders_delta", delta)
+        time.sleep(REFRESH_INTERVAL)  # Per-account rate limits are enforced by rate_limiter
+
+# Function to flatten one account's positions when the bus publishes them
+def on_positions(access_token, positions):
+    client_name = client_names.get(access_token)
+    if client_name is None:
+        return
+    client_positions = []
+    for position in positions:
+        net_qty = position.get("netQty", 0)
+        client_positions.append({
+            "name": client_name,
+            "symbol": position.get("tradingSymbol", "N/A"),
+            "product_type": position.get("productType", "N/A"),
+            "security_id": position.get("securityId"),
+            "quantity": net_qty,
+            "buy_avg": position.get("buyAvg", "N/A"),
+            "sell_avg": position.get("sellAvg", "N/A"),
+            "net_profit": position.get("realizedProfit", 0.0) + position.get("unrealizedProfit", 0.0),
+            "transaction_type": "BUY" if net_qty > 0 else "SELL" if net_qty < 0 else "CLOSED"
+        })
+    client_position_rows[client_name] = client_positions
+
+bus.subscribe(POSITIONS, on_positions)
+
+# Function to fetch one client's positions through the shared bus
+def fetch_client_positions(client_name, creds):
+    try:
+        positions = bus.get(POSITIONS, creds["access_token"], max_age=SHARED_MAX_AGE)
+        # Response sizes and latency are summarized by api_capture; failed payloads are captured there
+        if positions is None:
+            logging.warning("No data returned for positions of %s", client_name)
+            return []
+    except Exception as e:
+        logging.error("Error fetching positions for %s: %s", client_name, str(e))
+        return []
+    return client_position_rows.get(client_name, [])
 
 def fetch_positions():
     global categorized_positions
+    fetch_executor = fetch_pool(POSITIONS)
     while True:
         updated_positions = {"open": [], "closed": []}
-        for client_name, creds in clients.items():
-            try:
-                dhan = dhanhq(creds["client_id"], creds["access_token"])
-                response = dhan.get_positions()
-                
-                # Debugging API Response
-                logging.info("API Response for positions (%s): %s", client_name, response)
-
-                if isinstance(response, str):
-                    response = json.loads(response)
-
-                if "data" in response and isinstance(response["data"], list):
-                    for position in response["data"]:
-                        net_qty = position.get("netQty", 0)
-                        position_data = {
-                            "name": client_name,
-                            "symbol": position.get("tradingSymbol", "N/A"),
-                            "quantity": net_qty,
-                            "buy_avg": position.get("buyAvg", "N/A"),
-                            "sell_avg": position.get("sellAvg", "N/A"),
-                            "net_profit": position.get("realizedProfit", 0.0) + position.get("unrealizedProfit", 0.0),
-                            "transaction_type": "BUY" if net_qty > 0 else "SELL" if net_qty < 0 else "CLOSED"
-                        }
-                        if net_qty == 0:
-                            updated_positions["closed"].append(position_data)
-                        else:
-                            updated_positions["open"].append(position_data)
+        # Poll every client at once; results come back in client order
+        results = fetch_executor.map(fetch_client_positions, list(clients), list(clients.values()))
+        for client_positions in results:
+            for position_data in client_positions:
+                if position_data["quantity"] == 0:
+                    updated_positions["closed"].append(position_data)
                 else:
-                    logging.warning("No data returned for positions of %s", client_name)
+                    updated_positions["open"].append(position_data)
 
-            except Exception as e:
-                logging.error("Error fetching positions for %s: %s", client_name, str(e))
-        
         categorized_positions = updated_positions
-        socketio.emit("update_positions", categorized_positions)
-        time.sleep(5)  # Adding delay to avoid API rate limits
+        delta = snapshots["positions"].publish(updated_positions)
+        if delta is not None:
+            socketio.emit("positions_delta", delta)
+        time.sleep(REFRESH_INTERVAL)  # Per-account rate limits are enforced by rate_limiter
+
+# Only the process holding this lock runs the pollers, however many workers or instances share the host
+POLLER_LOCK_PATH = os.environ.get("DASHBOARD_POLLER_LOCK", os.path.join(tempfile.gettempdir(), "copy-trading-pollers.lock"))
+background_lock = threading.Lock()
+poller_lock_file = None
+
+# Function to start fetch_orders/fetch_positions and the copy engine once; returns False if another process owns them
+def start_background_tasks():
+    global poller_lock_file
+    with background_lock:
+        if poller_lock_file is not None:
+            return True
+        lock_file = open(POLLER_LOCK_PATH, "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            logging.warning("Pollers are owned by another process (%s); this one will not refresh snapshots.", POLLER_LOCK_PATH)
+            return False
+        poller_lock_file = lock_file
+        load_clients()
+        engine_supervisor.start()
+        threading.Thread(target=fetch_orders, daemon=True, name="fetch-orders").start()
+        threading.Thread(target=fetch_positions, daemon=True, name="fetch-positions").start()
+        logging.info("Started order and position pollers in process %s.", os.getpid())
+        return True
 
+# Development server; production runs `gunicorn -c gunicorn.conf.py app:app` (see Procfile)
 if __name__ == "__main__":
     logging.info("Starting Flask app...")
 
-    threading.Thread(target=fetch_orders, daemon=True).start()
-    threading.Thread(target=fetch_positions, daemon=True).start()
+    start_background_tasks()
 
     port = int(os.environ.get("PORT", 10000))
-    socketio.run(app, host="0.0.0.0", port=port, debug=False)
+    socketio.run(app, host="0.0.0.0", port=port, debug=False, allow_unsafe_werkzeug=True)
@@ -0,0 +1,79 @@
+import os
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+# Records written between flushes while the queue stays busy
+FLUSH_EVERY = 256
+
+# Enqueues the record untouched, so %-formatting happens on the writer thread rather than the caller's
+class LazyQueueHandler(QueueHandler):
+    def prepare(self, record):
+        return record
+
+# Writes each record to its logger's file; files are flushed in batches by BatchingQueueListener
+class BatchedFileWriter(logging.Handler):
+    def __init__(self, formatter):
+        super().__init__()
+        self.setFormatter(formatter)
+        self.paths = {}  # logger name -> file path
+        self.files = {}  # logger name -> open file, opened on first record
+        self.pending = 0
+
+    def add_file(self, name, path):
+        self.paths[name] = path
+
+    def emit(self, record):
+        try:
+            file = self.files.get(record.name)
+            if file is None:
+                file = self.files[record.name] = open(self.paths[record.name], "a", encoding="utf-8")
+            file.write(self.format(record) + "\n")
+            self.pending += 1
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        for file in self.files.values():
+            file.flush()
+        self.pending = 0
+
+    def close(self):
+        self.flush()
+        for file in self.files.values():
+            file.close()
+        self.files.clear()
+        super().close()
+
+# Background writer that flushes once the queue drains, or every FLUSH_EVERY records under load
+class BatchingQueueListener(QueueListener):
+    def handle(self, record):
+        super().handle(record)
+        for handler in self.handlers:
+            if self.queue.empty() or handler.pending >= FLUSH_EVERY:
+                handler.flush()
+
+    def stop(self):
+        super().stop()
+        for handler in self.handlers:
+            handler.close()
+
+# Function to give each name a logger writing to <folder>/<name>.log through one background writer thread
+def start_file_loggers(folder, names, fmt='%(asctime)s - %(message)s'):
+    log_queue = queue.SimpleQueue()
+    producer = LazyQueueHandler(log_queue)
+    writer = BatchedFileWriter(logging.Formatter(fmt))
+    loggers = {}
+    for name in names:
+        writer.add_file(name, os.path.join(folder, f"{name}.log"))
+        logger = logging.getLogger(name)
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(producer)
+        # File only: echoing to the console would put a synchronous write back on the caller's path
+        logger.propagate = False
+        loggers[name] = logger
+    listener = BatchingQueueListener(log_queue, writer)
+    listener.start()
+    atexit.register(listener.stop)
+    return loggers
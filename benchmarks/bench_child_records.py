@@ -0,0 +1,90 @@
+"""Per-order payload-building overhead: DataFrame.iterrows() vs precompiled ChildAccount records.
+
+Run from the repository root:
+    python benchmarks/bench_child_records.py --children 100
+"""
+import os
+import sys
+import time
+import argparse
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from accounts import build_child_records
+
+MASTER_ORDER = {
+    "orderId": "1000001", "orderStatus": "PENDING", "orderType": "LIMIT", "transactionType": "BUY",
+    "exchangeSegment": "NSE_EQ", "productType": "INTRADAY", "validity": "DAY", "securityId": "1333",
+    "quantity": 10, "price": 1520.5, "triggerPrice": 0,
+}
+
+# Function to build a synthetic child roster shaped like data/access_token.xlsx
+def make_children(count):
+    return pd.DataFrame({
+        "name": [f"child{i}" for i in range(count)],
+        "client_id": [1100000000 + i for i in range(count)],
+        "access_token": [f"token-{i}" for i in range(count)],
+        "Type": ["child"] * count,
+        "Multiplier": [1 + i % 3 for i in range(count)],
+    })
+
+# Old hot path: one pandas Series per child per order
+def payloads_iterrows(child_accounts, order):
+    order_id = order.get("orderId")
+    payloads = []
+    for _, child in child_accounts.iterrows():
+        multiplier = child['Multiplier']
+        payloads.append((child['access_token'], child['client_id'], child['name'], {
+            "dhanClientId": child['client_id'],
+            "correlationId": f"copy_{order_id}",
+            "transactionType": order["transactionType"],
+            "exchangeSegment": order["exchangeSegment"],
+            "productType": order["productType"],
+            "orderType": order["orderType"],
+            "validity": order["validity"],
+            "securityId": order["securityId"],
+            "quantity": int(order["quantity"]) * multiplier,
+            "price": order.get("price", ""),
+            "triggerPrice": order.get("triggerPrice", "")
+        }))
+    return payloads
+
+# New hot path: shared fields built once, then one dict per precompiled record
+def payloads_records(child_records, order):
+    base_order_details = {
+        "correlationId": f"copy_{order.get('orderId')}",
+        "transactionType": order["transactionType"],
+        "exchangeSegment": order["exchangeSegment"],
+        "productType": order["productType"],
+        "orderType": order["orderType"],
+        "validity": order["validity"],
+        "securityId": order["securityId"],
+        "price": order.get("price", ""),
+        "triggerPrice": order.get("triggerPrice", "")
+    }
+    quantity = int(order["quantity"])
+    return [(child.access_token, child.client_id, child.name, child.build_order(base_order_details, quantity))
+            for child in child_records]
+
+# Function to time `func` and return microseconds per call
+def time_per_call(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--children", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    child_accounts = make_children(args.children)
+    child_records = build_child_records(child_accounts)
+
+    before = time_per_call(lambda: payloads_iterrows(child_accounts, MASTER_ORDER), args.iterations)
+    after = time_per_call(lambda: payloads_records(child_records, MASTER_ORDER), args.iterations)
+    print(f"children={args.children} iterrows_us_per_order={before:.1f} records_us_per_order={after:.1f} speedup={before / after:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""Copy engine hot-path benchmarks. Prints one JSON object per result line so runs can be diffed across commits.
+
+    python benchmarks/bench_copy_engine.py                 # full suite
+    python benchmarks/bench_copy_engine.py --quick         # smaller sizes
+    python benchmarks/bench_copy_engine.py --only process_order --out results.jsonl
+
+Exits non-zero if a benchmark's behaviour checks fail (order_stream checks copying, routing, filtering and gap-fill).
+
+HTTP is answered in-process by a null adapter, so results measure the engine rather than the network.
+The per-account rate limiter stays in the path with unlimited rates: its locking is measured, its waiting is not.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+import contextlib
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Read when rate_limiter is first imported (through accounts below), so set before any repo import.
+# The benchmark measures engine overhead, not the broker's rate limits
+os.environ["DHAN_ORDER_RATE"] = os.environ["DHAN_READ_RATE"] = "1e9"
+
+import requests
+from requests.adapters import BaseAdapter
+from bench_child_records import make_children
+from rate_limiter import get_limiter, request_kind
+
+# Answers every request instantly with a 200 and a fresh orderId, after taking the account's rate limiter
+# like RateLimitedAdapter does
+class NullAdapter(BaseAdapter):
+    def __init__(self, limiter=None):
+        super().__init__()
+        self.limiter = limiter
+        self.sent = 0
+
+    def send(self, request, **kwargs):
+        if self.limiter is not None:
+            self.limiter.acquire(request_kind(request.method))
+        self.sent += 1
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({"orderId": f"N{self.sent}", "orderStatus": "PENDING"}).encode()
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+# Function to import and load the engine inside a throwaway working directory with a 1-child roster
+def load_engine():
+    import dhan_simulator
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    dhan_simulator.write_roster(workdir, 1)
+    os.chdir(workdir)
+    os.environ["COPY_ORDER_DB"] = os.path.join(workdir, "copy_orders.db")
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        import Copy_Trading_19_12_24 as engine
+        engine.load_accounts()
+    return engine
+
+# Function to point the engine at `count` synthetic children whose sessions use the null adapter
+def use_children(engine, count):
+    import dhan_session
+    from accounts import build_child_records
+    engine.child_records = build_child_records(make_children(count))
+    # The pool is sized to the roster when first used, so drop the one built for the previous roster
+    with engine.fan_out_lock:
+        if engine.fan_out_executor is not None:
+            engine.fan_out_executor.shutdown(wait=False)
+            engine.fan_out_executor = None
+    for child in engine.child_records:
+        session = dhan_session.get_session(child.access_token)
+        adapter = NullAdapter(get_limiter(child.access_token))
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+def master_order(order_id, status="PENDING", update_time=None):
+    return {
+        "orderId": str(order_id), "orderStatus": status, "orderType": "LIMIT", "transactionType": "BUY",
+        "exchangeSegment": "NSE_EQ", "productType": "INTRADAY", "validity": "DAY", "securityId": "1333",
+        "quantity": 10, "price": 1520.5, "triggerPrice": 0,
+        "updateTime": update_time or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+def bench_process_order(engine, quick):
+    from order_diff import NEW
+    results = []
+    for children in ((1, 10, 100) if quick else (1, 10, 100, 500)):
+        use_children(engine, children)
+        orders = max(20, 2000 // children) // (4 if quick else 1)
+        start = time.perf_counter()
+        for index in range(orders):
+            engine.process_order(master_order(f"P{children}-{index}"), NEW)
+        elapsed = time.perf_counter() - start
+        results.append({"bench": "process_order", "children": children, "orders": orders,
+                        "orders_per_s": round(orders / elapsed, 1),
+                        "child_orders_per_s": round(orders * children / elapsed, 1),
+                        "us_per_order": round(elapsed / orders * 1e6, 1)})
+    # Let the store's background writer finish so its commits do not leak into the next benchmark
+    engine.order_store.flush()
+    return results
+
+def bench_synchronize_orders(engine, quick):
+    from order_diff import OrderBookDiff
+    from ttl_cache import TTLCache
+    results = []
+    use_children(engine, 1)
+    for size in ((100, 1000) if quick else (100, 500, 1000, 5000)):
+        # Built like the engine's own book, including its TTLCache-backed last_seen store
+        engine.order_book = OrderBookDiff(is_fresh=engine.is_fresh_order,
+                                          last_seen=TTLCache(engine.CACHE_MAXSIZE, engine.CACHE_TTL))
+        # REJECTED orders are diffed but never copied, so no HTTP is involved
+        book = [master_order(f"S{size}-{index}", status="REJECTED", update_time="2026-01-01 09:15:00")
+                for index in range(size)]
+        engine.synchronize_orders(master_orders=book)
+        polls = 20 if quick else 50
+        start = time.perf_counter()
+        for _ in range(polls):
+            engine.synchronize_orders(master_orders=book)
+        unchanged = (time.perf_counter() - start) / polls
+        start = time.perf_counter()
+        for poll in range(polls):
+            for order in book[:10]:
+                order["updateTime"] = f"2026-01-01 09:{16 + poll // 60:02d}:{poll % 60:02d}"
+            engine.synchronize_orders(master_orders=book)
+        changed = (time.perf_counter() - start) / polls
+        results.append({"bench": "synchronize_orders", "book_size": size, "polls": polls,
+                        "us_per_poll_unchanged": round(unchanged * 1e6, 1),
+                        "us_per_poll_10_changed": round(changed * 1e6, 1)})
+    return results
+
+def bench_convert_update_time(engine, quick):
+    calls = 20000 if quick else 200000
+    value = "2026-10-18 10:15:42"
+    start = time.perf_counter()
+    for _ in range(calls):
+        engine.convert_update_time(value)
+    elapsed = time.perf_counter() - start
+    return [{"bench": "convert_update_time", "calls": calls, "ns_per_call": round(elapsed / calls * 1e9, 1)}]
+
+def bench_processed_memory(engine, quick):
+    # Simulated clock: each order advances time so TTL eviction happens as it would over real days
+    orders_per_day = 5000 if quick else 50000
+    days = 3
+    clock = [0.0]
+    caches = (engine.processed_order_ids_placed, engine.processed_order_ids_canceled, engine.order_mapping)
+    for cache in caches:
+        cache.clear()
+        cache.timer = lambda: clock[0]
+    results = []
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    seconds_per_order = 24 * 60 * 60 / orders_per_day
+    for day in range(days):
+        for index in range(orders_per_day):
+            order_id = f"D{day}-{index}"
+            engine.processed_order_ids_placed.add(order_id)
+            engine.order_mapping[order_id] = {1100000000: f"C{order_id}"}
+            if index % 4 == 0:
+                engine.processed_order_ids_canceled.add(order_id)
+            clock[0] += seconds_per_order
+        current, peak = tracemalloc.get_traced_memory()
+        results.append({"bench": "processed_memory", "day": day + 1, "orders_per_day": orders_per_day,
+                        "entries": sum(len(cache) for cache in caches),
+                        "bytes": current - baseline, "peak_bytes": peak - baseline})
+    tracemalloc.stop()
+    for cache in caches:
+        cache.timer = time.monotonic
+        cache.clear()
+    return results
+
+# Function to build an order-update feed message as the live stream sends it
+def feed_update(order_no, client_id, correlation_id=""):
+    return {
+        "OrderNo": order_no, "ClientId": str(client_id), "CorrelationId": correlation_id, "Status": "Pending",
+        "TxnType": "B", "Exchange": "NSE", "Segment": "E", "Product": "I", "OrderType": "LMT", "Validity": "DAY",
+        "SecurityId": "1333", "Quantity": 10, "Price": 1520.5,
+        "LastUpdatedTime": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("Order update stream did not reach the expected state")
+        time.sleep(0.01)
+
+# Push latency through the stub stream, then checks of the filters, reconnect and gap-fill signalling
+def bench_order_stream(engine, quick):
+    import order_update_stub
+    from order_diff import OrderBookDiff
+    from order_stream import OrderUpdateStream, normalize_order_update
+    from ttl_cache import TTLCache
+    use_children(engine, 10)
+    engine.order_book = OrderBookDiff(is_fresh=engine.is_fresh_order,
+                                      last_seen=TTLCache(engine.CACHE_MAXSIZE, engine.CACHE_TTL))
+    engine.order_book.seeded = True
+    master_id = engine.master_account["client_id"]
+    server = order_update_stub.start_stub_server()
+    handled = queue.Queue()
+
+    def on_order(order):
+        engine.handle_order_update(order)
+        handled.put(time.perf_counter())
+
+    stream = OrderUpdateStream(master_id, engine.master_account["access_token"], on_order,
+                               url=f"ws://127.0.0.1:{server.server_port}/").start()
+    try:
+        wait_for(stream.is_connected)
+        # Block until the stub has registered the login, so the first push is not lost
+        wait_for(lambda: order_update_stub.connections)
+        stream.should_poll()
+        updates = 50 if quick else 500
+        latencies = []
+        for index in range(updates):
+            sent = time.perf_counter()
+            order_update_stub.push_order_update(feed_update(f"W{index}", master_id))
+            latencies.append(handled.get(timeout=5) - sent)
+        copied = sum(f"W{index}" in engine.processed_order_ids_placed for index in range(updates))
+
+        # The stub routes by login ClientId, so another account's update is not delivered at all
+        routed = order_update_stub.push_order_update(feed_update("F0", "1999999999")) == 0
+        # Another account's order and one of our own copies must never reach the diff
+        engine.handle_order_update(normalize_order_update(feed_update("F1", "1999999999")))
+        engine.handle_order_update(normalize_order_update(feed_update("F2", master_id, "copy_W0")))
+        filtered = "F1" not in engine.order_book.last_seen and "F2" not in engine.order_book.last_seen
+
+        # Outage: the stream must reconnect on its own and ask for one gap-fill poll
+        polled_while_healthy = stream.should_poll()
+        started = time.perf_counter()
+        order_update_stub.drop_connections()
+        wait_for(lambda: not stream.is_connected())
+        wait_for(stream.is_connected)
+        reconnect = time.perf_counter() - started
+        gap_fill = stream.should_poll()
+    finally:
+        stream.stop()
+        server.shutdown()
+    latencies.sort()
+    checks = {"all_copied": copied == updates, "routed_by_client": routed, "filtered_foreign_and_own": filtered,
+              "gap_fill_after_reconnect": gap_fill and not polled_while_healthy}
+    return [{"bench": "order_stream", "updates": updates, "copied": copied,
+             "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+             "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+             "reconnect_s": round(reconnect, 2), **checks,
+             "failed": [name for name, passed in checks.items() if not passed]}]
+
+BENCHMARKS = {
+    "process_order": bench_process_order,
+    "synchronize_orders": bench_synchronize_orders,
+    "convert_update_time": bench_convert_update_time,
+    "processed_memory": bench_processed_memory,
+    "order_stream": bench_order_stream,
+}
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy engine hot-path benchmarks")
+    parser.add_argument("--quick", action="store_true", help="Smaller sizes for a fast smoke run")
+    parser.add_argument("--only", choices=sorted(BENCHMARKS), action="append")
+    parser.add_argument("--out", help="Also append results to this JSON-lines file")
+    args = parser.parse_args()
+    out_path = os.path.abspath(args.out) if args.out else None
+
+    engine = load_engine()
+    meta = {"bench": "meta", "commit": git_revision(), "python": sys.version.split()[0],
+            "timestamp": datetime.now().isoformat(timespec="seconds"), "quick": args.quick}
+    lines = [meta]
+    stdout = sys.stdout
+    print(json.dumps(meta), flush=True)
+    for name in args.only or BENCHMARKS:
+        # The engine prints a line per order; keep stdout for results only
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            results = BENCHMARKS[name](engine, args.quick)
+        for result in results:
+            result["commit"] = meta["commit"]
+            print(json.dumps(result), file=stdout, flush=True)
+        lines.extend(results)
+    if out_path:
+        with open(out_path, "a") as file:
+            for line in lines:
+                file.write(json.dumps(line) + "\n")
+    # Benchmarks that also verify behaviour list failed checks; any failure fails the run
+    failed = [f"{line['bench']}: {name}" for line in lines for name in line.get("failed", ())]
+    if failed:
+        print("Failed checks: " + ", ".join(failed), file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""Dashboard load benchmark: app.py against dhan_simulator with N simulated browser tabs.
+
+Each tab replays static/dashboard.js refreshAll (one /get_snapshot GET per tick) and optionally holds a Socket.IO connection to time orders_delta/positions_delta fan-out.
+Orders are placed and cancelled in the simulator during the run, so the pollers have changes to emit.
+
+    python benchmarks/bench_dashboard.py --clients 60 --orders 50 --browsers 30 --duration 30
+
+Prints one JSON report. Linux only (CPU time is read from /proc). app_cpu_* covers the web process tree
+(gunicorn arbiter and workers included) without the copy engine, which is reported as engine_cpu_s.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import defaultdict
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The requests one refreshAll tick makes
+REFRESH_ALL = ["/get_snapshot?orders=pending,cancelled,traded,rejected,others&positions=open,closed"
+               "&order_fields=name,symbol,transaction_type,quantity,price,status,order_id"
+               "&position_fields=name,symbol,quantity,buy_avg,sell_avg,net_profit"]
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_for(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url, timeout=1).status_code < 500:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+# Function to wait until the copy engine answers, so its start-up CPU stays out of the measured window
+def wait_for_engine(app_url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if requests.get(app_url + "/get_copy_trading_status", timeout=5).json()["status"] != "Unavailable":
+            return
+        time.sleep(0.2)
+    raise RuntimeError(f"Copy engine did not come up within {timeout}s")
+
+def proc_stat(pid):
+    with open(f"/proc/{pid}/stat") as file:
+        return file.read().rsplit(")", 1)[1].split()
+
+def is_copy_engine(pid):
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as file:
+            return b"copy_engine_service.py" in file.read()
+    except OSError:
+        return False
+
+# Function to read the user+system CPU seconds of a whole process tree from /proc, as (web, copy engine).
+# The engine is a child of app.py but a grandchild under gunicorn, so it is walked to and reported on its own
+def process_tree_cpu_seconds(pid):
+    stats, children = {}, defaultdict(list)
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            fields = proc_stat(entry)
+        except OSError:
+            continue
+        stats[int(entry)] = fields
+        children[int(fields[1])].append(int(entry))
+    web = engine = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children[current])
+        fields = stats.get(current)
+        if fields is None:
+            continue
+        ticks = int(fields[11]) + int(fields[12])
+        if is_copy_engine(current):
+            engine += ticks
+        else:
+            web += ticks
+    clock_ticks = os.sysconf("SC_CLK_TCK")
+    return web / clock_ticks, engine / clock_ticks
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+# Function to place `orders` orders in each simulated client account
+def seed_orders(base_url, roster, orders):
+    sides = ("BUY", "SELL")
+    for row in roster.itertuples():
+        session = requests.Session()
+        session.headers["access-token"] = row.access_token
+        for order in range(orders):
+            session.post(f"{base_url}/orders", json={
+                "dhanClientId": str(row.client_id), "transactionType": sides[order % 2], "exchangeSegment": "NSE_EQ",
+                "productType": "INTRADAY", "orderType": "MARKET" if order % 3 == 0 else "LIMIT", "validity": "DAY",
+                "securityId": str(1000 + order % 25), "quantity": 1 + order % 5, "price": 100 + order % 7,
+            })
+
+# Function to keep the books changing: each tick places a LIMIT order in the next account and cancels the
+# previous one; every fifth tick also fills a MARKET order so positions change too
+def churn_orders(base_url, roster, stop, interval, placed):
+    sessions = []
+    for row in roster.itertuples():
+        session = requests.Session()
+        session.headers["access-token"] = row.access_token
+        sessions.append((session, str(row.client_id)))
+    previous = None
+    tick = 0
+    while not stop.wait(interval):
+        session, client_id = sessions[tick % len(sessions)]
+        order = {"dhanClientId": client_id, "transactionType": "BUY", "exchangeSegment": "NSE_EQ",
+                 "productType": "INTRADAY", "orderType": "LIMIT", "validity": "DAY",
+                 "securityId": str(2000 + tick % 25), "quantity": 1, "price": 90}
+        try:
+            if previous is not None:
+                previous[0].delete(f"{base_url}/orders/{previous[1]}", timeout=10)
+            response = session.post(f"{base_url}/orders", json=order, timeout=10)
+            previous = (session, response.json()["orderId"])
+            if tick % 5 == 0:
+                session.post(f"{base_url}/orders", json=dict(order, orderType="MARKET", price=0), timeout=10)
+            placed.append(tick)
+        except (requests.RequestException, ValueError, KeyError):
+            previous = None
+        tick += 1
+
+# One browser tab polling like dashboard.js
+def browser(app_url, stop, interval, latencies, errors):
+    session = requests.Session()
+    while not stop.is_set():
+        tick = time.perf_counter()
+        for path in REFRESH_ALL:
+            started = time.perf_counter()
+            try:
+                response = session.get(app_url + path, timeout=30)
+                response.content
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+            except requests.RequestException as e:
+                errors.append(type(e).__name__)
+                continue
+            latencies.append(time.perf_counter() - started)
+        stop.wait(max(0.0, interval - (time.perf_counter() - tick)))
+
+# One Socket.IO listener recording when each emit arrives
+def socket_listener(app_url, arrivals, stop):
+    import socketio
+    client = socketio.Client(reconnection=False)
+    counts = defaultdict(int)
+
+    def on_event(event):
+        def handler(data):
+            arrivals[(event, counts[event])].append(time.perf_counter())
+            counts[event] += 1
+        return handler
+
+    client.on("orders_delta", on_event("orders_delta"))
+    client.on("positions_delta", on_event("positions_delta"))
+    try:
+        # websocket-client is not a dependency, so listeners use long-polling like a fallback browser
+        client.connect(app_url, transports=["polling"])
+        stop.wait()
+    finally:
+        client.disconnect()
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard load benchmark")
+    parser.add_argument("--clients", type=int, default=20, help="Broker accounts the dashboard polls")
+    parser.add_argument("--orders", type=int, default=20, help="Orders seeded per account")
+    parser.add_argument("--browsers", type=int, default=30, help="Simulated browser tabs")
+    parser.add_argument("--socket-clients", type=int, default=None, help="Socket.IO listeners (default: one per browser)")
+    parser.add_argument("--interval", type=float, default=1.0, help="refreshAll period per tab")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--broker-latency-ms", type=float, default=30.0)
+    parser.add_argument("--churn-interval", type=float, default=1.0,
+                        help="Seconds between simulator order changes during the run (0 = static books)")
+    parser.add_argument("--gunicorn", action="store_true", help="Serve the app with gunicorn.conf.py instead of app.py's dev server")
+    args = parser.parse_args()
+    socket_clients = args.browsers if args.socket_clients is None else args.socket_clients
+
+    import dhan_simulator
+    workdir = tempfile.mkdtemp(prefix="bench-dashboard-")
+    roster = dhan_simulator.write_roster(workdir, args.clients - 1)
+    sim_port, app_port = free_port(), free_port()
+    base_url = f"http://127.0.0.1:{sim_port}/v2"
+    app_url = f"http://127.0.0.1:{app_port}"
+    env = dict(os.environ, PORT=str(app_port), DHAN_API_BASE_URL=base_url, PYTHONPATH=ROOT,
+               COPY_ORDER_DB=os.path.join(workdir, "copy_orders.db"),
+               DASHBOARD_POLLER_LOCK=os.path.join(workdir, "pollers.lock"),
+               COPY_ENGINE_SOCKET=os.path.join(workdir, "copy-engine.sock"))
+    log = open(os.path.join(workdir, "bench.log"), "w")
+    processes = []
+    try:
+        simulator = subprocess.Popen([sys.executable, os.path.join(ROOT, "dhan_simulator.py"), "--port", str(sim_port)],
+                                     cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        processes.append(simulator)
+        wait_for(f"http://127.0.0.1:{sim_port}/sim/stats")
+        seed_orders(base_url, roster, args.orders)
+        requests.post(f"http://127.0.0.1:{sim_port}/sim/config", json={"latency_ms": args.broker_latency_ms})
+
+        if args.gunicorn:
+            command = [sys.executable, "-m", "gunicorn", "-c", os.path.join(ROOT, "gunicorn.conf.py"), "app:app"]
+        else:
+            command = [sys.executable, os.path.join(ROOT, "app.py")]
+        dashboard = subprocess.Popen(command,
+                                     cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        processes.append(dashboard)
+        wait_for(app_url + "/get_copy_trading_status")
+        wait_for_engine(app_url)
+
+        stop = threading.Event()
+        latencies, errors = [], []
+        arrivals = defaultdict(list)
+        threads = [threading.Thread(target=socket_listener, args=(app_url, arrivals, stop), daemon=True)
+                   for _ in range(socket_clients)]
+        threads += [threading.Thread(target=browser, args=(app_url, stop, args.interval, latencies, errors), daemon=True)
+                    for _ in range(args.browsers)]
+        churned = []
+        if args.churn_interval > 0:
+            threads.append(threading.Thread(target=churn_orders, daemon=True,
+                                            args=(base_url, roster, stop, args.churn_interval, churned)))
+        cpu_before, engine_cpu_before = process_tree_cpu_seconds(dashboard.pid)
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        elapsed = time.perf_counter() - started
+        cpu_after, engine_cpu_after = process_tree_cpu_seconds(dashboard.pid)
+        cpu_used, engine_cpu_used = cpu_after - cpu_before, engine_cpu_after - engine_cpu_before
+        for thread in threads:
+            thread.join(timeout=10)
+
+        # Fan-out: spread between the first and last listener receiving the same emit
+        fan_out = [max(times) - min(times) for times in arrivals.values() if len(times) == socket_clients]
+        requests_done = len(latencies)
+        to_ms = lambda value: None if value is None else round(value * 1000, 2)
+        report = {
+            "clients": args.clients, "orders_per_client": args.orders, "browsers": args.browsers,
+            "socket_clients": socket_clients, "duration_s": round(elapsed, 1),
+            "requests": requests_done, "errors": len(errors),
+            "requests_per_s": round(requests_done / elapsed, 1),
+            "p50_ms": to_ms(percentile(latencies, 0.50)), "p99_ms": to_ms(percentile(latencies, 0.99)),
+            "max_ms": to_ms(max(latencies) if latencies else None),
+            "app_cpu_s": round(cpu_used, 2),
+            "app_cpu_ms_per_request": round(cpu_used / requests_done * 1000, 3) if requests_done else None,
+            "app_cpu_utilisation": round(cpu_used / elapsed, 2),
+            "engine_cpu_s": round(engine_cpu_used, 2),
+            "churn_ticks": len(churned), "emits_seen": len(arrivals), "emits_complete": len(fan_out),
+            "emit_fan_out_p50_ms": to_ms(percentile(fan_out, 0.50)),
+            "emit_fan_out_max_ms": to_ms(max(fan_out) if fan_out else None),
+        }
+        print(json.dumps(report, indent=2))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        log.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""Copy engine as a separate, supervised process, controlled over a local Unix socket.
+
+The web process starts it through EngineSupervisor and talks to it with EngineClient:
+    client.call("toggle", enabled=True, max_concurrency=64)
+    client.call("status") / client.call("cache_stats") / client.call("latency")
+
+It can also be run on its own, e.g. next to a dashboard on another process manager:
+    python copy_engine_service.py --socket /tmp/copy-engine.sock
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import logging
+import signal
+import secrets
+import argparse
+import tempfile
+import threading
+import subprocess
+from multiprocessing.connection import Listener, Client
+
+ENGINE_SOCKET = os.environ.get("COPY_ENGINE_SOCKET", os.path.join(tempfile.gettempdir(), "copy-engine.sock"))
+IPC_TIMEOUT = float(os.environ.get("COPY_ENGINE_IPC_TIMEOUT", 5))
+# Seconds to wait before restarting a crashed engine; a run that lasted a minute resets the backoff
+RESTART_BACKOFF = (1, 2, 5, 10, 30)
+STABLE_RUN = 60
+
+# Function to read the socket's auth key, creating it (owner-only) on first use
+def load_authkey(address, create=False):
+    path = address + ".key"
+    if create and not os.path.exists(path):
+        descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, "w") as file:
+            file.write(secrets.token_hex(32))
+    with open(path) as file:
+        return file.read().strip().encode()
+
+# Runs inside the engine process: owns the copy loop and answers IPC commands
+class EngineService:
+    def __init__(self, address):
+        import rate_limiter
+        # The dashboard reads the same accounts from its own process; leave it its share of the read budget
+        rate_limiter.set_read_share(1 - rate_limiter.DASHBOARD_READ_SHARE)
+        import Copy_Trading_19_12_24 as engine
+        engine.load_accounts()
+        self.engine = engine
+        self.address = address
+        self.state_path = address + ".state"
+        self.enabled = False
+        self.running = False
+        self.lock = threading.Lock()
+        self.commands = {
+            "ping": lambda: "pong",
+            "toggle": self.toggle,
+            "status": self.status,
+            "cache_stats": engine.cache_stats,
+            "latency": self.latency,
+            "shared": self.shared,
+            "polled_feeds": self.polled_feeds,
+        }
+
+    def run_copy_trading(self):
+        logging.info("Copy Trading function started.")
+        stream = self.engine.start_order_stream() if self.engine.use_order_stream else None
+        try:
+            while True:
+                with self.lock:
+                    if not self.enabled:
+                        break
+                # One failed poll (e.g. a broker timeout) must not stop copying for the rest of the run
+                try:
+                    # With a healthy stream the REST poll only fills gaps
+                    if stream is None or stream.should_poll():
+                        self.engine.synchronize_orders()
+                except Exception as e:
+                    logging.error("Error in Copy Trading: %s", str(e))
+                time.sleep(1)
+        finally:
+            if stream is not None:
+                stream.stop()
+            with self.lock:
+                self.running = False
+            logging.info("Copy Trading function stopped.")
+
+    def toggle(self, enabled, max_concurrency=None):
+        if max_concurrency:
+            self.engine.set_max_concurrency(max_concurrency)
+        with self.lock:
+            self.enabled = bool(enabled)
+            if self.enabled and not self.running:
+                self.running = True
+                threading.Thread(target=self.run_copy_trading, daemon=True, name="copy-trading").start()
+        # Kept across engine restarts so a crash does not silently switch copying off; the concurrency saved is
+        # the one in effect, so a toggle without it keeps an earlier setting
+        with open(self.state_path, "w") as file:
+            json.dump({"enabled": self.enabled, "max_concurrency": self.engine.max_concurrency}, file)
+        return self.status()
+
+    def status(self):
+        return {"enabled": self.enabled, "running": self.running, "pid": os.getpid()}
+
+    def latency(self):
+        import latency
+        return latency.snapshot()
+
+    # Function to list the (feed, access token) pairs this engine polls itself, the only ones worth asking for
+    def polled_feeds(self):
+        from order_bus import ORDERS
+        return [(ORDERS, self.engine.master_account["access_token"])]
+
+    # Function to hand the web process an order book this engine fetched within max_age seconds
+    def shared(self, feed, access_token, max_age):
+        from order_bus import bus
+        cached = bus.latest.get((feed, access_token))
+        if cached is None:
+            return None
+        age = time.monotonic() - cached[0]
+        return (age, cached[1]) if age <= max_age else None
+
+    def restore(self):
+        try:
+            with open(self.state_path) as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return
+        if state.get("enabled"):
+            logging.info("Resuming copy trading after an engine restart.")
+            self.toggle(True, state.get("max_concurrency"))
+
+    def serve(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        listener = Listener(self.address, family="AF_UNIX", authkey=load_authkey(self.address, create=True))
+        self.restore()
+        logging.info("Copy engine listening on %s (pid %s).", self.address, os.getpid())
+        while True:
+            try:
+                connection = listener.accept()
+            except Exception as e:
+                logging.warning("Rejected copy engine connection: %s", str(e))
+                continue
+            threading.Thread(target=self.serve_connection, args=(connection,), daemon=True).start()
+
+    def serve_connection(self, connection):
+        with connection:
+            while True:
+                try:
+                    command, kwargs = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    connection.send((True, self.commands[command](**kwargs)))
+                except Exception as e:
+                    connection.send((False, f"{type(e).__name__}: {e}"))
+
+# Function to exit when the supervising process goes away, so engines are never orphaned
+def exit_with_parent(parent_pid):
+    while os.getppid() == parent_pid:
+        time.sleep(1)
+    logging.warning("Supervisor exited; stopping copy engine.")
+    os.kill(os.getpid(), signal.SIGTERM)
+
+# Used by the web process: one persistent connection, reopened on failure
+class EngineClient:
+    def __init__(self, address=ENGINE_SOCKET):
+        self.address = address
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    # Function to run a command in the engine; raises ConnectionError if it is unreachable
+    def call(self, command, timeout=IPC_TIMEOUT, **kwargs):
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    if self.connection is None:
+                        self.connection = Client(self.address, family="AF_UNIX", authkey=load_authkey(self.address))
+                    self.connection.send((command, kwargs))
+                    if not self.connection.poll(timeout):
+                        raise TimeoutError(f"Copy engine did not answer {command} within {timeout}s")
+                    ok, result = self.connection.recv()
+                    break
+                except (OSError, EOFError) as e:
+                    # A stale connection from before an engine restart fails once; retry on a fresh one
+                    self.close()
+                    if attempt or isinstance(e, TimeoutError):
+                        raise ConnectionError(f"Copy engine unavailable: {e}")
+        if not ok:
+            raise RuntimeError(result)
+        return result
+
+# Starts the engine process and restarts it with backoff whenever it exits
+class EngineSupervisor:
+    def __init__(self, address=ENGINE_SOCKET):
+        self.address = address
+        self.process = None
+        self.stopping = False
+
+    def start(self):
+        # A fresh supervisor starts with copying off, like the in-process engine did
+        if os.path.exists(self.address + ".state"):
+            os.unlink(self.address + ".state")
+        atexit.register(self.stop)
+        threading.Thread(target=self.supervise, daemon=True, name="copy-engine-supervisor").start()
+
+    def supervise(self):
+        restarts = 0
+        command = [sys.executable, os.path.abspath(__file__), "--socket", self.address, "--parent", str(os.getpid())]
+        while not self.stopping:
+            started = time.monotonic()
+            self.process = subprocess.Popen(command)
+            logging.info("Started copy engine process %s.", self.process.pid)
+            code = self.process.wait()
+            if self.stopping:
+                return
+            restarts = 0 if time.monotonic() - started > STABLE_RUN else restarts + 1
+            delay = RESTART_BACKOFF[min(restarts, len(RESTART_BACKOFF) - 1)]
+            logging.error("Copy engine exited with code %s; restarting in %ss.", code, delay)
+            time.sleep(delay)
+
+    def stop(self):
+        self.stopping = True
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the copy engine as an IPC-controlled process")
+    parser.add_argument("--socket", default=ENGINE_SOCKET)
+    parser.add_argument("--parent", type=int, help="Exit when this process does")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    # Exit through SystemExit so atexit handlers (order store flush) run on terminate
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    if args.parent:
+        threading.Thread(target=exit_with_parent, args=(args.parent,), daemon=True).start()
+    EngineService(args.socket).serve()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from rate_limiter import get_limiter, request_kind
+
+# Dhan REST API root; point it at dhan_simulator.py for offline runs
+API_BASE_URL = os.environ.get("DHAN_API_BASE_URL", "https://api.dhan.co/v2").rstrip("/")
+
+# Connect/read timeouts (seconds) applied to every Dhan API call
+CONNECT_TIMEOUT = float(os.environ.get("DHAN_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(os.environ.get("DHAN_READ_TIMEOUT", 10))
+REQUEST_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+# Keep-alive pool sizes per account session
+POOL_CONNECTIONS = int(os.environ.get("DHAN_POOL_CONNECTIONS", 4))
+POOL_MAXSIZE = int(os.environ.get("DHAN_POOL_MAXSIZE", 16))
+
+# Adapter that waits for the account's rate limiter before every request
+class RateLimitedAdapter(HTTPAdapter):
+    def __init__(self, limiter, **kwargs):
+        self.limiter = limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        self.limiter.acquire(request_kind(request.method))
+        return super().send(request, **kwargs)
+
+# One pooled session per access token
+sessions = {}
+sessions_lock = threading.Lock()
+
+# Function to build a keep-alive session with preset Dhan headers
+def create_session(access_token):
+    session = requests.Session()
+    session.headers.update({
+        "Content-Type": "application/json",
+        "Accept": "application/json",
+        "access-token": access_token,
+    })
+    # Orders are not idempotent, so never retry automatically
+    adapter = RateLimitedAdapter(get_limiter(access_token), pool_connections=POOL_CONNECTIONS,
+                                 pool_maxsize=POOL_MAXSIZE, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+# Function to get (or lazily create) the shared session for an access token
+def get_session(access_token):
+    session = sessions.get(access_token)
+    if session is None:
+        with sessions_lock:
+            session = sessions.get(access_token)
+            if session is None:
+                session = create_session(access_token)
+                sessions[access_token] = session
+    return session
+
+# Function to close every pooled session, e.g. after tokens are rotated
+def close_sessions():
+    with sessions_lock:
+        for session in sessions.values():
+            session.close()
+        sessions.clear()
@@ -0,0 +1,310 @@
+"""Local Dhan API simulator for offline load and latency testing.
+
+Implements the v2 order book, place/modify/cancel, trade book and positions for any number of
+accounts (one per access token), with injectable latency, per-account rate limits and error rates.
+Order status changes are also pushed on a local order-update WebSocket at /order-updates.
+
+    python dhan_simulator.py --port 9000 --latency-ms 40 --jitter-ms 10 --rate-limit 25 --error-rate 0.01
+    DHAN_API_BASE_URL=http://127.0.0.1:9000/v2 DHAN_ORDER_UPDATE_URL=ws://127.0.0.1:9000/order-updates python app.py
+
+Use --write-roster DIR --accounts 200 to generate matching data/access_token.xlsx and clients.xlsx.
+"""
+import os
+import time
+import random
+import argparse
+import threading
+import itertools
+import logging
+import pandas as pd
+from datetime import datetime
+from flask import Flask, request, jsonify
+from werkzeug.serving import make_server
+from rate_limiter import TokenBucket
+import order_update_stub
+
+app = Flask(__name__)
+
+# Runtime behaviour, adjustable with POST /sim/config
+config = {
+    "latency_ms": 0.0,  # added to every API response
+    "jitter_ms": 0.0,  # uniform +/- jitter on top of latency_ms
+    "rate_limit": 0.0,  # requests per second per account, 0 disables
+    "error_rate": 0.0,  # fraction of API calls answered with a broker error
+    "fill_after": None,  # seconds until a pending LIMIT order fills, None never fills
+    "market_price": 100.0,  # fill price for MARKET orders without a price
+}
+
+state_lock = threading.RLock()
+accounts = {}  # access token -> {"orders": {orderId: order}, "trades": [...]}
+rate_buckets = {}
+order_ids = itertools.count(int(time.time()) * 1000)
+stats = {"requests": 0, "rate_limited": 0, "errors": 0, "orders_placed": 0}
+
+# Dhan-style error bodies (dhanhq reads internalErrorCode/internalErrorMessage)
+def error_response(status, code, message):
+    return jsonify({"errorType": "Simulator", "errorCode": code, "errorMessage": message,
+                    "internalErrorCode": code, "internalErrorMessage": message}), status
+
+def now_str():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def get_account(token):
+    account = accounts.get(token)
+    if account is None:
+        account = accounts[token] = {"orders": {}, "trades": []}
+    return account
+
+# Function to convert a REST order into an order-update feed message
+def to_order_update(order):
+    exchange, _, segment = order["exchangeSegment"].partition("_")
+    return {
+        "OrderNo": order["orderId"], "ClientId": order["dhanClientId"], "Status": order["orderStatus"],
+        "TxnType": order["transactionType"][0], "Exchange": exchange, "Segment": {"EQ": "E", "FNO": "D", "CURRENCY": "C", "COMM": "M"}.get(segment, segment),
+        "Product": {"CNC": "C", "INTRADAY": "I", "MARGIN": "M", "MTF": "F", "CO": "V", "BO": "B"}.get(order["productType"], order["productType"]),
+        "OrderType": {"LIMIT": "LMT", "MARKET": "MKT", "STOP_LOSS": "SL", "STOP_LOSS_MARKET": "SLM"}.get(order["orderType"], order["orderType"]),
+        "Validity": order["validity"], "SecurityId": order["securityId"], "Symbol": order["tradingSymbol"],
+        "Quantity": order["quantity"], "TradedQty": order["filledQty"], "Price": order["price"],
+        "TriggerPrice": order["triggerPrice"], "LastUpdatedTime": order["updateTime"], "CorrelationId": order["correlationId"],
+    }
+
+def publish(order):
+    order_update_stub.push_order_update(to_order_update(order))
+
+# Function to fill an order completely and add it to the account's trade book
+def fill_order(account, order, price):
+    order["orderStatus"] = "TRADED"
+    order["filledQty"] = order["quantity"]
+    order["averageTradedPrice"] = price
+    order["updateTime"] = now_str()
+    account["trades"].append({
+        "dhanClientId": order["dhanClientId"], "orderId": order["orderId"], "exchangeOrderId": order["orderId"],
+        "exchangeTradeId": f"T{order['orderId']}", "transactionType": order["transactionType"],
+        "exchangeSegment": order["exchangeSegment"], "productType": order["productType"], "orderType": order["orderType"],
+        "tradingSymbol": order["tradingSymbol"], "securityId": order["securityId"], "tradedQuantity": order["quantity"],
+        "tradedPrice": price, "createTime": order["createTime"], "updateTime": order["updateTime"],
+        "exchangeTime": order["updateTime"],
+    })
+    publish(order)
+
+# Function to fill pending LIMIT orders whose fill_after delay has passed
+def fill_due_orders(account):
+    fill_after = config["fill_after"]
+    if fill_after is None:
+        return
+    now = time.time()
+    for order in account["orders"].values():
+        if order["orderStatus"] == "PENDING" and now - order["_created"] >= fill_after:
+            fill_order(account, order, order["price"] or config["market_price"])
+
+@app.before_request
+def simulate_broker():
+    if not request.path.startswith("/v2/"):
+        return None
+    stats["requests"] += 1
+    token = request.headers.get("access-token")
+    if not token:
+        return error_response(401, "DH-901", "Missing access-token")
+    delay = config["latency_ms"] + random.uniform(-config["jitter_ms"], config["jitter_ms"])
+    if delay > 0:
+        time.sleep(delay / 1000)
+    if config["rate_limit"]:
+        with state_lock:
+            bucket = rate_buckets.get(token)
+            if bucket is None or bucket.rate != config["rate_limit"]:
+                bucket = rate_buckets[token] = TokenBucket(config["rate_limit"])
+            limited = bucket.try_acquire(time.monotonic()) > 0
+        if limited:
+            stats["rate_limited"] += 1
+            return error_response(429, "DH-904", "Too many requests")
+    if config["error_rate"] and random.random() < config["error_rate"]:
+        stats["errors"] += 1
+        return error_response(500, "DH-908", "Simulated internal server error")
+    return None
+
+@app.route("/v2/orders", methods=["GET"])
+def list_orders():
+    with state_lock:
+        account = get_account(request.headers["access-token"])
+        fill_due_orders(account)
+        return jsonify([public_order(order) for order in account["orders"].values()])
+
+@app.route("/v2/orders", methods=["POST"])
+def place():
+    body = request.get_json(silent=True) or {}
+    missing = [field for field in ("transactionType", "exchangeSegment", "productType", "orderType", "securityId", "quantity") if field not in body]
+    if missing:
+        return error_response(400, "DH-905", f"Missing fields: {', '.join(missing)}")
+    with state_lock:
+        account = get_account(request.headers["access-token"])
+        order_id = str(next(order_ids))
+        created = now_str()
+        order = {
+            "dhanClientId": str(body.get("dhanClientId", "")), "orderId": order_id,
+            "correlationId": body.get("correlationId", ""), "orderStatus": "PENDING",
+            "transactionType": body["transactionType"], "exchangeSegment": body["exchangeSegment"],
+            "productType": body["productType"], "orderType": body["orderType"], "validity": body.get("validity", "DAY"),
+            "tradingSymbol": f"SIM{body['securityId']}", "securityId": str(body["securityId"]),
+            "quantity": int(body["quantity"]), "disclosedQuantity": int(body.get("disclosedQuantity") or 0),
+            "price": float(body.get("price") or 0), "triggerPrice": float(body.get("triggerPrice") or 0),
+            "createTime": created, "updateTime": created, "filledQty": 0, "averageTradedPrice": 0,
+            "_created": time.time(),
+        }
+        account["orders"][order_id] = order
+        stats["orders_placed"] += 1
+        publish(order)
+        if order["orderType"] == "MARKET":
+            fill_order(account, order, order["price"] or config["market_price"])
+        return jsonify({"orderId": order_id, "orderStatus": order["orderStatus"]})
+
+def find_order(order_id):
+    account = get_account(request.headers["access-token"])
+    return account, account["orders"].get(order_id)
+
+@app.route("/v2/orders/<order_id>", methods=["GET"])
+def get_order(order_id):
+    with state_lock:
+        account, order = find_order(order_id)
+        if order is None:
+            return error_response(404, "DH-906", f"Order {order_id} not found")
+        fill_due_orders(account)
+        return jsonify(public_order(order))
+
+@app.route("/v2/orders/<order_id>", methods=["PUT"])
+def modify(order_id):
+    body = request.get_json(silent=True) or {}
+    with state_lock:
+        account, order = find_order(order_id)
+        if order is None:
+            return error_response(404, "DH-906", f"Order {order_id} not found")
+        if order["orderStatus"] not in ("PENDING", "PART_TRADED"):
+            return error_response(400, "DH-906", f"Order {order_id} is {order['orderStatus']}")
+        for field, cast in (("orderType", str), ("quantity", int), ("price", float), ("triggerPrice", float), ("validity", str)):
+            if body.get(field) not in (None, ""):
+                order[field] = cast(body[field])
+        order["updateTime"] = now_str()
+        publish(order)
+        return jsonify({"orderId": order_id, "orderStatus": order["orderStatus"]})
+
+@app.route("/v2/orders/<order_id>", methods=["DELETE"])
+def cancel(order_id):
+    with state_lock:
+        account, order = find_order(order_id)
+        if order is None:
+            return error_response(404, "DH-906", f"Order {order_id} not found")
+        if order["orderStatus"] not in ("PENDING", "PART_TRADED", "TRANSIT"):
+            return error_response(400, "DH-906", f"Order {order_id} is {order['orderStatus']}")
+        order["orderStatus"] = "CANCELLED"
+        order["updateTime"] = now_str()
+        publish(order)
+        return jsonify({"orderId": order_id, "orderStatus": "CANCELLED"})
+
+@app.route("/v2/trades", methods=["GET"])
+def trade_book():
+    with state_lock:
+        account = get_account(request.headers["access-token"])
+        fill_due_orders(account)
+        return jsonify(list(account["trades"]))
+
+@app.route("/v2/positions", methods=["GET"])
+def positions():
+    with state_lock:
+        account = get_account(request.headers["access-token"])
+        fill_due_orders(account)
+        book = {}
+        for trade in account["trades"]:
+            key = (trade["securityId"], trade["productType"])
+            position = book.setdefault(key, {
+                "dhanClientId": trade["dhanClientId"], "tradingSymbol": trade["tradingSymbol"],
+                "securityId": trade["securityId"], "exchangeSegment": trade["exchangeSegment"],
+                "productType": trade["productType"], "buyQty": 0, "sellQty": 0, "buyValue": 0.0,
+                "sellValue": 0.0, "lastPrice": 0.0,
+            })
+            side = "buy" if trade["transactionType"] == "BUY" else "sell"
+            position[f"{side}Qty"] += trade["tradedQuantity"]
+            position[f"{side}Value"] += trade["tradedQuantity"] * trade["tradedPrice"]
+            position["lastPrice"] = trade["tradedPrice"]
+        result = []
+        for position in book.values():
+            buy_qty, sell_qty = position["buyQty"], position["sellQty"]
+            buy_avg = position["buyValue"] / buy_qty if buy_qty else 0.0
+            sell_avg = position["sellValue"] / sell_qty if sell_qty else 0.0
+            net_qty = buy_qty - sell_qty
+            closed_qty = min(buy_qty, sell_qty)
+            open_avg = buy_avg if net_qty > 0 else sell_avg
+            position.update({
+                "positionType": "LONG" if net_qty > 0 else "SHORT" if net_qty < 0 else "CLOSED",
+                "buyAvg": round(buy_avg, 2), "sellAvg": round(sell_avg, 2), "netQty": net_qty,
+                "realizedProfit": round(closed_qty * (sell_avg - buy_avg), 2) or 0.0,
+                "unrealizedProfit": round(net_qty * (position["lastPrice"] - open_avg), 2) or 0.0,
+            })
+            result.append(position)
+        return jsonify(result)
+
+# Function to drop internal bookkeeping fields before returning an order
+def public_order(order):
+    return {key: value for key, value in order.items() if not key.startswith("_")}
+
+@app.route("/sim/config", methods=["GET", "POST"])
+def sim_config():
+    if request.method == "POST":
+        config.update({key: value for key, value in (request.json or {}).items() if key in config})
+    return jsonify(config)
+
+@app.route("/sim/stats")
+def sim_stats():
+    with state_lock:
+        return jsonify(dict(stats, accounts=len(accounts),
+                            orders=sum(len(account["orders"]) for account in accounts.values())))
+
+@app.route("/sim/reset", methods=["POST"])
+def sim_reset():
+    with state_lock:
+        accounts.clear()
+        rate_buckets.clear()
+        stats.update({key: 0 for key in stats})
+    return jsonify({"message": "reset"})
+
+# Order-update stream for the simulated accounts (same protocol as order_update_stub.py)
+app.add_url_rule("/order-updates", view_func=order_update_stub.order_updates, websocket=True)
+
+# Function to write a master + N child roster (data/access_token.xlsx and clients.xlsx) under `directory`
+def write_roster(directory, count, multiplier=1):
+    rows = [{"name": "master", "client_id": 1000000000, "access_token": "sim-master", "Type": "master", "Multiplier": 1}]
+    rows += [{"name": f"child{i:04d}", "client_id": 1000000001 + i, "access_token": f"sim-child-{i:04d}",
+              "Type": "child", "Multiplier": multiplier} for i in range(count)]
+    os.makedirs(os.path.join(directory, "data"), exist_ok=True)
+    roster = pd.DataFrame(rows)
+    roster.to_excel(os.path.join(directory, "data", "access_token.xlsx"), index=False)
+    roster[["name", "client_id", "access_token"]].to_excel(os.path.join(directory, "clients.xlsx"), index=False)
+    return roster
+
+# Function to run the simulator in a background thread; returns the server (call .shutdown() to stop)
+def start_simulator(host="127.0.0.1", port=0, **overrides):
+    config.update(overrides)
+    server = make_server(host, port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="dhan-simulator", daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Dhan API simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Requests per second per account (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls answered with a 500")
+    parser.add_argument("--fill-after", type=float, default=None, help="Seconds until pending LIMIT orders fill")
+    parser.add_argument("--write-roster", metavar="DIR", help="Write a simulated account roster and exit")
+    parser.add_argument("--accounts", type=int, default=10, help="Child accounts in the written roster")
+    args = parser.parse_args()
+
+    if args.write_roster:
+        write_roster(args.write_roster, args.accounts)
+        print(f"Wrote master + {args.accounts} child accounts under {args.write_roster}")
+    else:
+        logging.basicConfig(level=logging.INFO)
+        config.update(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, rate_limit=args.rate_limit,
+                      error_rate=args.error_rate, fill_after=args.fill_after)
+        print(f"Dhan simulator on http://{args.host}:{args.port}/v2")
+        make_server(args.host, args.port, app, threaded=True).serve_forever()
@@ -0,0 +1,17 @@
+import os
+
+# One worker: Socket.IO sessions and the in-memory snapshots live in a single process.
+# Scaling past one worker needs a Socket.IO message queue and sticky sessions.
+bind = f"0.0.0.0:{os.environ.get('PORT', 10000)}"
+workers = 1
+# gthread keeps each WebSocket on its own thread; size this to the expected dashboard connections
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 256))
+graceful_timeout = 10
+keepalive = 5
+accesslog = "-"
+
+# Pollers are threads, so they start after the fork, in the worker that will serve the snapshots
+def post_worker_init(worker):
+    import app
+    app.start_background_tasks()
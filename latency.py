@@ -0,0 +1,82 @@
+import bisect
+import threading
+
+# Stages a copied order goes through
+DETECT_POLL = "detect_poll"  # master updateTime -> seen by the REST poll
+DETECT_STREAM = "detect_stream"  # master updateTime -> pushed by the order-update stream
+BUILD = "build"  # child payload construction
+SEND = "send"  # detection -> child request started (includes the fan-out queue wait)
+ACK = "ack"  # child HTTP call until the broker acknowledges (includes any rate-limit wait)
+TOTAL = "total"  # detection -> broker ack for the child
+CANCEL_ACK = "cancel_ack"
+MODIFY_ACK = "modify_ack"
+
+# Geometric bucket bounds from 100us to ~2 minutes (each bucket 25% wider than the last)
+BUCKET_BOUNDS = []
+bound = 0.0001
+while bound < 120:
+    BUCKET_BOUNDS.append(bound)
+    bound *= 1.25
+
+# Fixed-bucket latency histogram; percentiles are reported as bucket upper bounds
+class LatencyHistogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        seconds = max(0.0, seconds)
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(BUCKET_BOUNDS[index], self.max) if index < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+    def summary(self):
+        # Milliseconds are easier to read against an SLA
+        to_ms = lambda value: None if value is None else round(value * 1000, 3)
+        return {
+            "count": self.count,
+            "mean_ms": to_ms(self.total / self.count) if self.count else None,
+            "p50_ms": to_ms(self.percentile(0.50)),
+            "p95_ms": to_ms(self.percentile(0.95)),
+            "p99_ms": to_ms(self.percentile(0.99)),
+            "max_ms": to_ms(self.max),
+        }
+
+# stage -> account -> histogram
+histograms = {}
+histograms_lock = threading.Lock()
+
+# Function to record one stage duration (seconds) for an account
+def record(stage, account, seconds):
+    with histograms_lock:
+        histogram = histograms.setdefault(stage, {}).get(account)
+        if histogram is None:
+            histogram = histograms[stage][account] = LatencyHistogram()
+        histogram.record(seconds)
+
+# Function to return p50/p95/p99 per stage and account
+def snapshot():
+    with histograms_lock:
+        return {stage: {account: histogram.summary() for account, histogram in accounts.items()}
+                for stage, accounts in histograms.items()}
+
+def reset():
+    with histograms_lock:
+        histograms.clear()
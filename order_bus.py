@@ -0,0 +1,97 @@
+import time
+import logging
+import threading
+from dhan_session import get_session, REQUEST_TIMEOUT, API_BASE_URL
+from api_capture import capture
+
+# Feeds the bus can fetch, by REST path
+ORDERS = "orders"
+POSITIONS = "positions"
+FEED_PATHS = {ORDERS: "/orders", POSITIONS: "/positions"}
+
+# One fetch per account and feed, parsed once and shared by the copy engine and the dashboard
+class AccountBus:
+    def __init__(self):
+        self.latest = {}  # (feed, access token) -> (monotonic fetch time, parsed list)
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+        self.subscribers = {feed: [] for feed in FEED_PATHS}
+        self.fetches = {feed: 0 for feed in FEED_PATHS}
+        self.reuses = {feed: 0 for feed in FEED_PATHS}
+        # Optional peer(feed, access_token, max_age) -> (age, data) or None: another process's bus,
+        # e.g. the copy engine's, asked before fetching so its recent polls are reused here
+        self.peer = None
+
+    # Function to register callback(access_token, data), called once per successful fetch
+    def subscribe(self, feed, callback):
+        self.subscribers[feed].append(callback)
+
+    def lock_for(self, key):
+        lock = self.locks.get(key)
+        if lock is None:
+            with self.locks_lock:
+                lock = self.locks.setdefault(key, threading.Lock())
+        return lock
+
+    # Function to return the feed's data, fetching only if the shared copy is older than max_age seconds
+    def get(self, feed, access_token, max_age=0.0):
+        key = (feed, access_token)
+        # Concurrent callers for the same account wait for one fetch instead of issuing their own
+        with self.lock_for(key):
+            cached = self.latest.get(key)
+            if cached is not None and max_age > 0 and time.monotonic() - cached[0] <= max_age:
+                self.reuses[feed] += 1
+                return cached[1]
+            shared = self.ask_peer(feed, access_token, max_age)
+            if shared is not None:
+                self.reuses[feed] += 1
+                age, data = shared
+                self.latest[key] = (time.monotonic() - age, data)
+            else:
+                data = self.fetch(feed, access_token)
+                if data is None:
+                    return None
+                self.latest[key] = (time.monotonic(), data)
+        self.publish(feed, access_token, data)
+        return data
+
+    def ask_peer(self, feed, access_token, max_age):
+        if self.peer is None or max_age <= 0:
+            return None
+        try:
+            return self.peer(feed, access_token, max_age)
+        except Exception as e:
+            logging.debug("Bus peer unavailable: %s", str(e))
+            return None
+
+    def fetch(self, feed, access_token):
+        self.fetches[feed] += 1
+        started = time.perf_counter()
+        response = get_session(access_token).get(API_BASE_URL + FEED_PATHS[feed], timeout=REQUEST_TIMEOUT)
+        seconds = time.perf_counter() - started
+        data = None
+        if response.status_code == 200:
+            try:
+                data = response.json()
+            except ValueError:
+                pass
+        if not isinstance(data, list):
+            data = None
+            logging.warning("Failed to fetch %s (HTTP %s, %d bytes)", feed, response.status_code, len(response.content))
+        # Summaries always; the full body only for errors, samples and within the capture budget
+        capture.record(feed, access_token, response.status_code, response.content, seconds,
+                       None if data is None else len(data))
+        return data
+
+    def publish(self, feed, access_token, data):
+        for callback in self.subscribers[feed]:
+            try:
+                callback(access_token, data)
+            except Exception as e:
+                logging.error("Error in %s subscriber: %s", feed, str(e))
+
+    def stats(self):
+        return {"fetches": dict(self.fetches), "reuses": dict(self.reuses)}
+
+# Process-wide bus
+bus = AccountBus()
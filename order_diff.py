@@ -0,0 +1,60 @@
+# Transitions emitted by the order-book diff
+NEW = "new"
+MODIFIED = "modified"
+TRADED = "traded"
+CANCELLED = "cancelled"
+
+# Fields whose change counts as a real transition of a master order
+ORDER_STATE_FIELDS = ("orderStatus", "quantity", "price", "triggerPrice", "updateTime")
+
+# Function to extract the comparable state of an order
+def order_state(order):
+    return tuple(order.get(field) for field in ORDER_STATE_FIELDS)
+
+# Remembers the last seen state per master orderId and reports only real transitions
+class OrderBookDiff:
+    def __init__(self, is_fresh=None, last_seen=None):
+        # Any dict-like store works, e.g. a TTLCache to bound a long-running process
+        self.last_seen = {} if last_seen is None else last_seen
+        self.seeded = False
+        # Decides whether an order already in the book at startup should still be copied
+        self.is_fresh = is_fresh or (lambda order: False)
+
+    # Function to name the transition between two states (None when nothing changed)
+    def classify(self, previous, state):
+        if previous is None:
+            return NEW
+        if previous == state:
+            return None
+        status = state[0]
+        if status != previous[0]:
+            if status == "TRADED":
+                return TRADED
+            if status == "CANCELLED":
+                return CANCELLED
+        return MODIFIED
+
+    # Function to record one order and return its transition, if any
+    def apply(self, order):
+        order_id = order.get("orderId")
+        if order_id is None:
+            return None
+        state = order_state(order)
+        previous = self.last_seen.get(order_id)
+        if previous == state:
+            return None
+        self.last_seen[order_id] = state
+        # Before the first full book has been seen, old orders only build the baseline
+        if previous is None and not self.seeded and not self.is_fresh(order):
+            return None
+        return self.classify(previous, state)
+
+    # Function to diff a full order book, returning (event, order) for every change
+    def diff(self, orders):
+        changes = []
+        for order in orders:
+            event = self.apply(order)
+            if event:
+                changes.append((event, order))
+        self.seeded = True
+        return changes
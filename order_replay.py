@@ -0,0 +1,167 @@
+"""Record master order-book polls and replay them through the copy engine against the simulator.
+
+Record a live session (polls the master every second without copying):
+    python order_replay.py record --out sessions/2026-10-18.jsonl.gz
+or record while copying:
+    python Copy_Trading_19_12_24.py --record sessions/2026-10-18.jsonl.gz
+
+Replay against an in-process dhan_simulator (run from a directory with a simulated roster,
+e.g. one written by `dhan_simulator.py --write-roster`):
+    python order_replay.py replay sessions/2026-10-18.jsonl.gz --speed 10 --latency-ms 40
+"""
+import os
+import sys
+import json
+import gzip
+import time
+import argparse
+import tempfile
+from collections import Counter
+
+# Statuses the copy engine places child orders for (mirrors process_order)
+PLACEABLE_STATUSES = ("PENDING", "TRADED")
+
+# The pre-diff engine skipped orders whose updateTime was older than this at poll time
+LEGACY_FRESH_WINDOW = 5
+
+# Appends one gzip JSON line per poll whose order book changed
+class OrderRecorder:
+    def __init__(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.file = gzip.open(path, "at", encoding="utf-8")
+        self.last_orders = None
+        self.frames = 0
+
+    def record(self, orders, timestamp=None):
+        # Identical polls add nothing to a replay, so only changes are kept
+        if orders == self.last_orders:
+            return
+        self.last_orders = orders
+        self.file.write(json.dumps({"t": time.time() if timestamp is None else timestamp, "orders": orders},
+                                   separators=(",", ":")) + "\n")
+        self.file.flush()
+        self.frames += 1
+
+    def close(self):
+        self.file.close()
+
+# Function to read recorded frames as (timestamp, orders)
+def read_frames(path):
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                frame = json.loads(line)
+                yield frame["t"], frame["orders"]
+
+# Function to record the master's order book every `interval` seconds until interrupted
+def record(out, interval=1.0):
+    import Copy_Trading_19_12_24 as engine
+    engine.load_accounts()
+    recorder = OrderRecorder(out)
+    print(f"Recording master orders to {out} (Ctrl+C to stop)")
+    try:
+        while True:
+            orders = engine.fetch_master_orders(engine.master_account['access_token'])
+            if orders is not None:
+                recorder.record(orders)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.close()
+        print(f"Recorded {recorder.frames} changed order books")
+
+# Function to replay a recording through synchronize_orders and return the report
+def replay(path, speed=0.0, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, rate_limit=0.0):
+    import dhan_simulator
+    server = dhan_simulator.start_simulator(latency_ms=latency_ms, jitter_ms=jitter_ms,
+                                            error_rate=error_rate, rate_limit=rate_limit)
+    # The engine reads these at import time, so they must be set first
+    if "Copy_Trading_19_12_24" in sys.modules:
+        raise RuntimeError("Replay must run before the copy engine is imported, or it would use the live order store")
+    os.environ["DHAN_API_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v2"
+    # Always a throwaway store: a live COPY_ORDER_DB would get simulated ids and skew "already copied" checks
+    os.environ["COPY_ORDER_DB"] = os.path.join(tempfile.mkdtemp(prefix="replay-"), "copy_orders.db")
+    import Copy_Trading_19_12_24 as engine
+    import latency
+    engine.load_accounts()
+
+    first_seen = {}  # orderId -> (frame time, order) when first seen in a placeable state
+    frames = 0
+    previous_time = None
+    started = time.perf_counter()
+    for frame_time, orders in read_frames(path):
+        if speed and previous_time is not None:
+            time.sleep(max(0.0, (frame_time - previous_time) / speed))
+        previous_time = frame_time
+        for order in orders:
+            if order.get("orderId") not in first_seen and (
+                    order.get("orderType") == "MARKET" or order.get("orderStatus") in PLACEABLE_STATUSES):
+                first_seen[order.get("orderId")] = (frame_time, order)
+        engine.synchronize_orders(master_orders=orders)
+        frames += 1
+    elapsed = time.perf_counter() - started
+    engine.order_store.flush()
+
+    # Orders the old freshness check would have dropped: stale by more than 5s when first polled
+    missed_by_window = []
+    for order_id, (frame_time, order) in first_seen.items():
+        update_time = engine.convert_update_time(order["updateTime"]) if order.get("updateTime") else None
+        if update_time is None or frame_time - update_time > LEGACY_FRESH_WINDOW:
+            missed_by_window.append(order_id)
+
+    # Duplicates: a child holding more than one copy of the same master order
+    duplicates = 0
+    with dhan_simulator.state_lock:
+        for child in engine.child_records:
+            account = dhan_simulator.accounts.get(child.access_token, {"orders": {}})
+            copies = Counter(order["correlationId"] for order in account["orders"].values())
+            duplicates += sum(count - 1 for count in copies.values() if count > 1)
+
+    copied = [order_id for order_id in first_seen if order_id in engine.processed_order_ids_placed]
+    server.shutdown()
+    snapshot = latency.snapshot()
+    return {
+        "frames": frames,
+        "elapsed_s": round(elapsed, 3),
+        "speed": speed or "max",
+        "children": len(engine.child_records),
+        "master_orders": len(first_seen),
+        "orders_copied": len(copied),
+        "orders_not_copied": sorted(set(first_seen) - set(copied)),
+        "child_orders_placed": sum(len(engine.order_mapping.get(order_id) or {}) for order_id in copied),
+        "missed_by_5s_window": len(missed_by_window),
+        "duplicates": duplicates,
+        "latency": {stage: snapshot.get(stage, {}) for stage in (latency.SEND, latency.ACK, latency.TOTAL)},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay master order streams")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    record_parser = subcommands.add_parser("record", help="Record the live master order book")
+    record_parser.add_argument("--out", required=True)
+    record_parser.add_argument("--interval", type=float, default=1.0)
+    replay_parser = subcommands.add_parser("replay", help="Replay a recording against the simulator")
+    replay_parser.add_argument("path")
+    replay_parser.add_argument("--speed", type=float, default=0.0, help="1 = real time, 10 = 10x, 0 = as fast as possible")
+    replay_parser.add_argument("--latency-ms", type=float, default=0.0)
+    replay_parser.add_argument("--jitter-ms", type=float, default=0.0)
+    replay_parser.add_argument("--error-rate", type=float, default=0.0)
+    replay_parser.add_argument("--rate-limit", type=float, default=0.0)
+    replay_parser.add_argument("--report", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.out, args.interval)
+        return
+    report = replay(args.path, args.speed, args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit)
+    output = json.dumps(report, indent=2)
+    if args.report:
+        with open(args.report, "w") as file:
+            file.write(output)
+    print(output)
+
+if __name__ == "__main__":
+    sys.exit(main())
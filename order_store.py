@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import queue
+import sqlite3
+import threading
+import logging
+from datetime import datetime
+
+# Location of the copy-trading state database
+DB_PATH = os.environ.get("COPY_ORDER_DB", os.path.join(os.getcwd(), "data", "copy_orders.db"))
+
+# Writer batching: commit after this many rows or this many seconds, whichever comes first
+BATCH_SIZE = 200
+FLUSH_INTERVAL = 0.25
+
+# Rows older than this many days are deleted, checked at startup and then hourly by the writer
+RETENTION_DAYS = float(os.environ.get("COPY_ORDER_DB_RETENTION_DAYS", 7))
+PRUNE_INTERVAL = 60 * 60
+
+# IDs are stored without type affinity so client ids keep the type they were loaded with
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS order_mapping (
+    master_order_id NOT NULL,
+    child_client_id NOT NULL,
+    child_order_id NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (master_order_id, child_client_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS processed_orders (
+    order_id NOT NULL,
+    kind TEXT NOT NULL,
+    processed_at REAL NOT NULL,
+    PRIMARY KEY (order_id, kind)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS order_terms (
+    master_order_id NOT NULL PRIMARY KEY,
+    terms TEXT NOT NULL,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_order_mapping_created ON order_mapping (created_at);
+CREATE INDEX IF NOT EXISTS idx_processed_orders_time ON processed_orders (processed_at);
+CREATE INDEX IF NOT EXISTS idx_order_terms_updated ON order_terms (updated_at);
+"""
+
+# Persists master->child order links and processed order ids across restarts
+class OrderStore:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self.connect() as connection:
+            connection.executescript(SCHEMA)
+        # Lookups run on the order path, so they share one connection instead of opening their own
+        self.reader = self.connect(check_same_thread=False)
+        self.read_lock = threading.Lock()
+        self.pending = queue.Queue()
+        self.writer = threading.Thread(target=self.write_loop, name="order-store-writer", daemon=True)
+        self.writer.start()
+
+    def connect(self, **kwargs):
+        connection = sqlite3.connect(self.path, timeout=10, **kwargs)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    # Function to reload today's state: (order_mapping, placed ids, canceled ids, terms sent per master order)
+    def load(self, since=None):
+        if since is None:
+            since = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+        order_mapping, placed, canceled, terms = {}, set(), set(), {}
+        with self.connect() as connection:
+            rows = connection.execute(
+                "SELECT master_order_id, child_client_id, child_order_id FROM order_mapping WHERE created_at >= ?",
+                (since,))
+            for master_order_id, child_client_id, child_order_id in rows:
+                order_mapping.setdefault(master_order_id, {})[child_client_id] = child_order_id
+            rows = connection.execute(
+                "SELECT order_id, kind FROM processed_orders WHERE processed_at >= ?", (since,))
+            for order_id, kind in rows:
+                (placed if kind == "placed" else canceled).add(order_id)
+            rows = connection.execute(
+                "SELECT master_order_id, terms FROM order_terms WHERE updated_at >= ?", (since,))
+            for master_order_id, order_terms in rows:
+                terms[master_order_id] = tuple(json.loads(order_terms))
+        return order_mapping, placed, canceled, terms
+
+    # Function to look up the child orders of one master order (uses the primary-key index).
+    # Only called after the in-memory mapping let the order go, by which time its rows are committed
+    def get_child_orders(self, master_order_id):
+        with self.read_lock:
+            rows = self.reader.execute(
+                "SELECT child_client_id, child_order_id FROM order_mapping WHERE master_order_id = ?",
+                (master_order_id,))
+            return dict(rows.fetchall())
+
+    # Function to check whether an order id was already placed/canceled, however long ago
+    def was_processed(self, order_id, kind):
+        with self.read_lock:
+            row = self.reader.execute(
+                "SELECT 1 FROM processed_orders WHERE order_id = ? AND kind = ?", (order_id, kind)).fetchone()
+        return row is not None
+
+    # Function to get the order terms last sent to the children of a master order, or None
+    def get_terms(self, master_order_id):
+        with self.read_lock:
+            row = self.reader.execute(
+                "SELECT terms FROM order_terms WHERE master_order_id = ?", (master_order_id,)).fetchone()
+        return None if row is None else tuple(json.loads(row[0]))
+
+    # Queue writes; the background writer commits them in batches off the order path
+    def record_mapping(self, master_order_id, child_client_id, child_order_id):
+        self.pending.put(("mapping", (master_order_id, child_client_id, child_order_id, time.time())))
+
+    def record_processed(self, order_id, kind):
+        self.pending.put(("processed", (order_id, kind, time.time())))
+
+    def record_terms(self, master_order_id, terms):
+        self.pending.put(("terms", (master_order_id, json.dumps(terms), time.time())))
+
+    # Function to block until every queued write has been committed
+    def flush(self):
+        self.pending.join()
+
+    def close(self):
+        self.flush()
+
+    # Function to delete mappings and processed ids recorded before `before` (epoch seconds)
+    def prune(self, connection, before):
+        with connection:
+            mappings = connection.execute("DELETE FROM order_mapping WHERE created_at < ?", (before,)).rowcount
+            processed = connection.execute("DELETE FROM processed_orders WHERE processed_at < ?", (before,)).rowcount
+            connection.execute("DELETE FROM order_terms WHERE updated_at < ?", (before,))
+        if mappings or processed:
+            logging.info("Pruned %d order mappings and %d processed ids older than %s days",
+                         mappings, processed, RETENTION_DAYS)
+
+    def write_loop(self):
+        connection = self.connect()
+        next_prune = 0.0
+        while True:
+            if time.monotonic() >= next_prune:
+                try:
+                    self.prune(connection, time.time() - RETENTION_DAYS * 24 * 60 * 60)
+                except Exception as e:
+                    logging.error("Error pruning copy-trading state: %s", str(e))
+                next_prune = time.monotonic() + PRUNE_INTERVAL
+            try:
+                batch = [self.pending.get(timeout=PRUNE_INTERVAL)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(batch) < BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                with connection:
+                    mappings = [row for kind, row in batch if kind == "mapping"]
+                    processed = [row for kind, row in batch if kind == "processed"]
+                    terms = [row for kind, row in batch if kind == "terms"]
+                    if mappings:
+                        connection.executemany(
+                            "INSERT OR REPLACE INTO order_mapping VALUES (?, ?, ?, ?)", mappings)
+                    if processed:
+                        connection.executemany(
+                            "INSERT OR REPLACE INTO processed_orders VALUES (?, ?, ?)", processed)
+                    if terms:
+                        connection.executemany(
+                            "INSERT OR REPLACE INTO order_terms VALUES (?, ?, ?)", terms)
+            except Exception as e:
+                logging.error("Error writing copy-trading state: %s", str(e))
+            finally:
+                for _ in batch:
+                    self.pending.task_done()
@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import threading
+import logging
+from datetime import datetime
+from simple_websocket import Client, ConnectionClosed
+
+# Dhan live order-update feed (override to point at order_update_stub.py in tests)
+ORDER_UPDATE_URL = os.environ.get("DHAN_ORDER_UPDATE_URL", "wss://api-order-update.dhan.co/")
+
+# How often the REST order book is still polled while the stream is healthy
+GAP_FILL_INTERVAL = int(os.environ.get("DHAN_GAP_FILL_INTERVAL", 30))
+
+# Reconnect backoff bounds in seconds
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 30
+
+# Order-update feed codes -> REST order book values
+TRANSACTION_TYPES = {"B": "BUY", "S": "SELL"}
+ORDER_TYPES = {"LMT": "LIMIT", "MKT": "MARKET", "SL": "STOP_LOSS", "SLM": "STOP_LOSS_MARKET"}
+PRODUCT_TYPES = {"C": "CNC", "I": "INTRADAY", "M": "MARGIN", "F": "MTF", "V": "CO", "B": "BO"}
+EXCHANGE_SEGMENTS = {
+    ("NSE", "E"): "NSE_EQ", ("BSE", "E"): "BSE_EQ",
+    ("NSE", "D"): "NSE_FNO", ("BSE", "D"): "BSE_FNO",
+    ("NSE", "C"): "NSE_CURRENCY", ("BSE", "C"): "BSE_CURRENCY",
+    ("MCX", "M"): "MCX_COMM",
+}
+
+# Function to convert an order-update feed message into the REST order book format
+def normalize_order_update(data):
+    update_time = data.get("LastUpdatedTime") or data.get("OrderDateTime")
+    if update_time:
+        # The feed may carry fractional seconds, the REST book never does
+        update_time = update_time.split(".")[0]
+    else:
+        update_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    segment_key = (data.get("Exchange"), data.get("Segment"))
+    order_type = data.get("OrderType")
+    product = data.get("Product")
+    return {
+        "dhanClientId": data.get("ClientId"),
+        "orderId": str(data.get("OrderNo")),
+        "correlationId": data.get("CorrelationId", ""),
+        "orderStatus": str(data.get("Status", "")).upper(),
+        "transactionType": TRANSACTION_TYPES.get(data.get("TxnType"), data.get("TxnType")),
+        "exchangeSegment": EXCHANGE_SEGMENTS.get(segment_key, data.get("Segment")),
+        "productType": PRODUCT_TYPES.get(product, product),
+        "orderType": ORDER_TYPES.get(order_type, order_type),
+        "validity": data.get("Validity"),
+        "tradingSymbol": data.get("Symbol", ""),
+        "securityId": str(data.get("SecurityId")),
+        "quantity": data.get("Quantity", 0),
+        "price": data.get("Price", 0.0),
+        "triggerPrice": data.get("TriggerPrice", 0.0),
+        "filledQty": data.get("TradedQty", 0),
+        "updateTime": update_time,
+    }
+
+# Push-based master order feed with reconnect and REST gap-fill signalling
+class OrderUpdateStream:
+    def __init__(self, client_id, access_token, on_order, url=ORDER_UPDATE_URL, gap_fill_interval=GAP_FILL_INTERVAL):
+        self.client_id = str(client_id)
+        self.access_token = access_token
+        self.on_order = on_order
+        self.url = url
+        self.gap_fill_interval = gap_fill_interval
+        self.connected = threading.Event()
+        self.stopped = threading.Event()
+        self.ws = None
+        self.thread = None
+        self.last_poll = 0.0
+        self.gap_fill_pending = True
+        self.messages_received = 0
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name="order-update-stream", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        ws = self.ws
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+    def is_connected(self):
+        return self.connected.is_set()
+
+    # Function telling the poll loop whether a REST poll is needed this tick
+    def should_poll(self):
+        now = time.time()
+        if not self.connected.is_set() or self.gap_fill_pending or now - self.last_poll >= self.gap_fill_interval:
+            self.gap_fill_pending = False
+            self.last_poll = now
+            return True
+        return False
+
+    def run(self):
+        delay = RECONNECT_MIN_DELAY
+        while not self.stopped.is_set():
+            try:
+                self.ws = Client.connect(self.url)
+                self.ws.send(json.dumps({
+                    "LoginReq": {"MsgCode": 42, "ClientId": self.client_id, "Token": self.access_token},
+                    "UserType": "SELF",
+                }))
+                self.connected.set()
+                # Anything missed while disconnected is picked up by one REST poll
+                self.gap_fill_pending = True
+                delay = RECONNECT_MIN_DELAY
+                logging.info("Order update stream connected: %s", self.url)
+                while not self.stopped.is_set():
+                    message = self.ws.receive(timeout=1)
+                    if message is not None:
+                        self.handle_message(message)
+            except ConnectionClosed:
+                logging.warning("Order update stream closed, falling back to polling")
+            except Exception as e:
+                logging.error("Order update stream error: %s", str(e))
+            finally:
+                self.connected.clear()
+                if self.ws is not None:
+                    try:
+                        self.ws.close()
+                    except Exception:
+                        pass
+                    self.ws = None
+            if self.stopped.wait(delay):
+                break
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    def handle_message(self, message):
+        try:
+            payload = json.loads(message)
+        except ValueError:
+            logging.warning("Ignoring malformed order update: %s", message)
+            return
+        if payload.get("Type") != "order_alert" or not isinstance(payload.get("Data"), dict):
+            return
+        self.messages_received += 1
+        try:
+            self.on_order(normalize_order_update(payload["Data"]))
+        except Exception as e:
+            logging.error("Error handling order update: %s", str(e))
@@ -0,0 +1,88 @@
+"""Local stand-in for the Dhan order-update WebSocket, for tests and offline runs.
+
+    python order_update_stub.py --port 8765
+    DHAN_ORDER_UPDATE_URL=ws://127.0.0.1:8765/ python Copy_Trading_19_12_24.py --stream
+
+Push an update:  curl -X POST localhost:8765/push -H 'Content-Type: application/json' -d '{"OrderNo": "1", "ClientId": "1100000000", ...}'
+Drop the stream: curl -X POST localhost:8765/drop
+"""
+import json
+import threading
+import argparse
+import logging
+from flask import Flask, request, jsonify
+from simple_websocket import Server, ConnectionClosed
+from werkzeug.serving import make_server
+
+app = Flask(__name__)
+
+connections = {}  # logged-in WebSocket -> ClientId from its LoginReq
+connections_lock = threading.Lock()
+
+# Function to send one order update (feed "Data" dict) to the connections logged in as its ClientId
+def push_order_update(data):
+    message = json.dumps({"Type": "order_alert", "Data": data})
+    client_id = str(data.get("ClientId"))
+    with connections_lock:
+        targets = [ws for ws, login_id in connections.items() if login_id == client_id]
+    for ws in targets:
+        try:
+            ws.send(message)
+        except ConnectionClosed:
+            with connections_lock:
+                connections.pop(ws, None)
+    return len(targets)
+
+# Function to close every open connection, simulating a stream outage
+def drop_connections():
+    with connections_lock:
+        targets = list(connections)
+        connections.clear()
+    for ws in targets:
+        try:
+            ws.close()
+        except Exception:
+            pass
+    return len(targets)
+
+@app.route("/", websocket=True)
+def order_updates():
+    ws = Server.accept(request.environ)
+    try:
+        login = json.loads(ws.receive(timeout=10) or "{}").get("LoginReq") or {}
+        if not login.get("ClientId"):
+            ws.close(reason=1008, message="Login required")
+            return ""
+        with connections_lock:
+            connections[ws] = str(login["ClientId"])
+        # Keep the handler alive until the client or drop_connections() closes it
+        while True:
+            ws.receive()
+    except ConnectionClosed:
+        pass
+    finally:
+        with connections_lock:
+            connections.pop(ws, None)
+    return ""
+
+@app.route("/push", methods=["POST"])
+def push():
+    return jsonify({"delivered": push_order_update(request.json)})
+
+@app.route("/drop", methods=["POST"])
+def drop():
+    return jsonify({"dropped": drop_connections()})
+
+# Function to run the stub in a background thread; returns the server (call .shutdown() to stop)
+def start_stub_server(host="127.0.0.1", port=0):
+    server = make_server(host, port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="order-update-stub", daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Dhan order-update WebSocket stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    make_server(args.host, args.port, app, threaded=True).serve_forever()
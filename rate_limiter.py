@@ -0,0 +1,95 @@
+import os
+import time
+import threading
+
+# Requests per second allowed per account (Dhan publishes separate order and non-trading limits)
+ORDER_RATE = float(os.environ.get("DHAN_ORDER_RATE", 25))
+READ_RATE = float(os.environ.get("DHAN_READ_RATE", 20))
+
+# The dashboard and the copy engine run in separate processes with separate limiters, so each takes a
+# fixed share of every account's read budget. Only the engine places orders; it keeps the whole order budget.
+DASHBOARD_READ_SHARE = float(os.environ.get("DHAN_DASHBOARD_READ_SHARE", 0.75))
+read_share = 1.0
+
+ORDER = "order"
+READ = "read"
+
+# Classic token bucket: `rate` tokens per second, bursts up to `capacity`
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    # Function to take one token; returns 0 on success or the seconds to wait before retrying
+    def try_acquire(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+# Order and read buckets for one account; reads yield while any order call is waiting
+class AccountRateLimiter:
+    def __init__(self, order_rate=ORDER_RATE, read_rate=None):
+        if read_rate is None:
+            read_rate = READ_RATE * read_share
+        self.buckets = {ORDER: TokenBucket(order_rate), READ: TokenBucket(read_rate)}
+        self.condition = threading.Condition()
+        self.orders_waiting = 0
+        self.waits = {ORDER: 0, READ: 0}
+
+    def acquire(self, kind):
+        bucket = self.buckets[kind]
+        with self.condition:
+            if kind == ORDER:
+                self.orders_waiting += 1
+            try:
+                while True:
+                    if kind == READ and self.orders_waiting:
+                        # Order placement always goes first on this account
+                        self.waits[kind] += 1
+                        self.condition.wait(0.05)
+                        continue
+                    delay = bucket.try_acquire(time.monotonic())
+                    if delay == 0:
+                        return
+                    self.waits[kind] += 1
+                    self.condition.wait(delay)
+            finally:
+                if kind == ORDER:
+                    self.orders_waiting -= 1
+                    self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            return {"orders_waiting": self.orders_waiting, "waits": dict(self.waits)}
+
+# One limiter per access token, shared by everything in this process
+limiters = {}
+limiters_lock = threading.Lock()
+
+# Function to give this process `share` of each account's read budget, e.g. DASHBOARD_READ_SHARE in the web
+# process and the rest in the copy engine; applies to existing limiters too
+def set_read_share(share):
+    global read_share
+    with limiters_lock:
+        read_share = share
+        for limiter in limiters.values():
+            with limiter.condition:
+                bucket = limiter.buckets[READ]
+                bucket.rate = bucket.capacity = READ_RATE * share
+                bucket.tokens = min(bucket.tokens, bucket.capacity)
+
+def get_limiter(access_token):
+    limiter = limiters.get(access_token)
+    if limiter is None:
+        with limiters_lock:
+            limiter = limiters.setdefault(access_token, AccountRateLimiter())
+    return limiter
+
+# Function to classify an HTTP method: reads are GETs, everything else places/changes orders
+def request_kind(method):
+    return READ if method.upper() == "GET" else ORDER
@@ -1,72 +1,88 @@
 $(document).ready(function () {
     let selectedPositions = {};
 
-    function fetchData(url, tableId, category, fields) {
-        $.get(url, function (response) {
-            let tableBody = $(tableId);
-            tableBody.empty();
+    const orderFields = ['name', 'symbol', 'transaction_type', 'quantity', 'price', 'status', 'order_id'];
+    const positionFields = ['name', 'symbol', 'quantity', 'buy_avg', 'sell_avg', 'net_profit'];
+    const orderTables = {
+        pending: '#pending_orders_table',
+        cancelled: '#cancelled_orders_table',
+        traded: '#traded_orders_table',
+        rejected: '#rejected_orders_table',
+        others: '#others_orders_table'
+    };
+    const positionTables = {
+        open: '#open_positions_table',
+        closed: '#closed_positions_table'
+    };
+    // One request per tick for everything the tables render
+    const snapshotUrl = '/get_snapshot?' + $.param({
+        orders: Object.keys(orderTables).join(','),
+        positions: Object.keys(positionTables).join(','),
+        order_fields: orderFields.join(','),
+        position_fields: positionFields.join(',')
+    });
 
-            if (response[category] && response[category].length > 0) {
-                response[category].forEach(row => {
-                    let tr = $("<tr>");
-                    let rowId = `${row["name"]}-${row["symbol"]}-${row["order_id"]}`; // Unique row ID based on Name + Symbol + Order ID
+    function renderTable(tableId, rows, fields) {
+        let tableBody = $(tableId);
+        tableBody.empty();
+
+        if (rows && rows.length > 0) {
+            rows.forEach(row => {
+                let tr = $("<tr>");
+                let rowId = `${row["name"]}-${row["symbol"]}-${row["order_id"]}`; // Unique row ID based on Name + Symbol + Order ID
+
+                // Checkbox for individual selection
+                let checkbox = $("<input>")
+                    .attr("type", "checkbox")
+                    .addClass("select-item")
+                    .attr("data-row-id", rowId);
+
+                // Restore selection state
+                if (selectedPositions[rowId]) {
+                    checkbox.prop("checked", true);
+                }
+
+                checkbox.change(function () {
+                    if (this.checked) {
+                        selectedPositions[rowId] = true;
+                    } else {
+                        delete selectedPositions[rowId];
+                    }
+                });
 
-                    // Checkbox for individual selection
-                    let checkbox = $("<input>")
-                        .attr("type", "checkbox")
-                        .addClass("select-item")
-                        .attr("data-row-id", rowId);
+                tr.append($("<td>").append(checkbox));
 
-                    // Restore selection state
-                    if (selectedPositions[rowId]) {
-                        checkbox.prop("checked", true);
-                    }
+                fields.forEach(field => {
+                    let cell = $("<td>").text(row[field] !== undefined && row[field] !== null ? row[field] : "N/A");
 
-                    checkbox.change(function () {
-                        if (this.checked) {
-                            selectedPositions[rowId] = true;
-                        } else {
-                            delete selectedPositions[rowId];
-                        }
-                    });
-
-                    tr.append($("<td>").append(checkbox));
-
-                    fields.forEach(field => {
-                        let cell = $("<td>").text(row[field] !== undefined && row[field] !== null ? row[field] : "N/A");
-
-                        // Highlight Net Profit column with color
-                        if (field === "net_profit") {
-                            let profitValue = parseFloat(row[field]);
-                            if (!isNaN(profitValue)) {
-                                cell.css({
-                                    "font-weight": "bold",
-                                    "color": profitValue < 0 ? "red" : "green"
-                                });
-                            }
+                    // Highlight Net Profit column with color
+                    if (field === "net_profit") {
+                        let profitValue = parseFloat(row[field]);
+                        if (!isNaN(profitValue)) {
+                            cell.css({
+                                "font-weight": "bold",
+                                "color": profitValue < 0 ? "red" : "green"
+                            });
                         }
+                    }
 
-                        tr.append(cell);
-                    });
-
-                    tableBody.append(tr);
+                    tr.append(cell);
                 });
-            } else {
-                tableBody.append(`<tr><td colspan="${fields.length + 1}">No data available</td></tr>`);
-            }
-        }).fail(function (xhr) {
-            console.error(`Error fetching ${category} data: `, xhr.responseText);
-        });
+
+                tableBody.append(tr);
+            });
+        } else {
+            tableBody.append(`<tr><td colspan="${fields.length + 1}">No data available</td></tr>`);
+        }
     }
 
     function refreshAll() {
-        fetchData('/get_orders', '#pending_orders_table', 'pending', ['name', 'symbol', 'transaction_type', 'quantity', 'price', 'status', 'order_id']);
-        fetchData('/get_orders', '#cancelled_orders_table', 'cancelled', ['name', 'symbol', 'transaction_type', 'quantity', 'price', 'status', 'order_id']);
-        fetchData('/get_orders', '#traded_orders_table', 'traded', ['name', 'symbol', 'transaction_type', 'quantity', 'price', 'status', 'order_id']);
-        fetchData('/get_orders', '#rejected_orders_table', 'rejected', ['name', 'symbol', 'transaction_type', 'quantity', 'price', 'status', 'order_id']);
-        fetchData('/get_orders', '#others_orders_table', 'others', ['name', 'symbol', 'transaction_type', 'quantity', 'price', 'status', 'order_id']);
-        fetchData('/get_positions', '#open_positions_table', 'open', ['name', 'symbol', 'quantity', 'buy_avg', 'sell_avg', 'net_profit']);
-        fetchData('/get_positions', '#closed_positions_table', 'closed', ['name', 'symbol', 'quantity', 'buy_avg', 'sell_avg', 'net_profit']);
+        $.get(snapshotUrl, function (response) {
+            $.each(orderTables, (category, tableId) => renderTable(tableId, response.orders[category], orderFields));
+            $.each(positionTables, (category, tableId) => renderTable(tableId, response.positions[category], positionFields));
+        }).fail(function (xhr) {
+            console.error("Error fetching dashboard snapshot: ", xhr.responseText);
+        });
     }
 
     $('#refreshOrders').click(refreshAll);
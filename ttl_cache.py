@@ -0,0 +1,103 @@
+import time
+import threading
+from collections import OrderedDict
+
+# Thread-safe mapping with size- and time-based eviction; also usable as a set via add()
+class TTLCache:
+    def __init__(self, maxsize, ttl, timer=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.data = OrderedDict()  # key -> (expires_at, value), oldest first
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0  # dropped because the cache was full
+        self.expirations = 0  # dropped because their TTL ran out
+
+    # Function to drop expired entries from the old end, then trim to maxsize
+    def evict(self, now):
+        data = self.data
+        while data:
+            key, (expires_at, _) = next(iter(data.items()))
+            if expires_at > now:
+                break
+            data.popitem(last=False)
+            self.expirations += 1
+        while len(data) > self.maxsize:
+            data.popitem(last=False)
+            self.evictions += 1
+
+    def lookup(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[0] <= self.timer():
+            del self.data[key]
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            now = self.timer()
+            self.data[key] = (now + self.ttl, value)
+            self.data.move_to_end(key)
+            self.evict(now)
+
+    def __getitem__(self, key):
+        with self.lock:
+            entry = self.lookup(key)
+        if entry is None:
+            raise KeyError(key)
+        return entry[1]
+
+    def __contains__(self, key):
+        with self.lock:
+            return self.lookup(key) is not None
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.lookup(key)
+        return default if entry is None else entry[1]
+
+    def setdefault(self, key, default=None):
+        with self.lock:
+            entry = self.lookup(key)
+            if entry is not None:
+                return entry[1]
+            self[key] = default
+            return default
+
+    def add(self, key):
+        self[key] = True
+
+    def update(self, mapping):
+        for key, value in mapping.items():
+            self[key] = value
+
+    def keys(self):
+        with self.lock:
+            self.evict(self.timer())
+            return list(self.data)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": len(self.data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
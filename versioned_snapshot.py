@@ -0,0 +1,170 @@
+import json
+import gzip
+import base64
+import bisect
+import hashlib
+import threading
+from collections import deque
+
+# Deltas kept for clients that fall behind; older clients get a full snapshot instead
+DELTA_HISTORY = 64
+
+# Sorted query results kept per snapshot version
+QUERY_CACHE_SIZE = 128
+
+# Function to make any row value orderable: numbers before text, text compared as strings
+def sort_value(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, value)
+    return (1, "" if value is None else str(value))
+
+# Function to turn a row's sort key into an opaque pagination cursor
+def encode_cursor(sort_key):
+    return base64.urlsafe_b64encode(json.dumps(sort_key, separators=(",", ":")).encode()).decode()
+
+# Function to read a cursor back into a sort key; raises ValueError if it is malformed
+def decode_cursor(cursor):
+    try:
+        value, key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (tuple(value), key)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+# Function to serialize data once into (etag, json bytes, gzipped json bytes)
+def encode(data):
+    body = json.dumps(data, separators=(",", ":")).encode()
+    # Content hash, so ETags stay valid across restarts that reset version counters
+    etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+    return etag, body, gzip.compress(body, compresslevel=6)
+
+# Categorized dashboard rows with a version number and the deltas between versions.
+# A delta is {"version", "base", "upserted": {category: [rows]}, "removed": [keys]}; keys are unique
+# across categories, so an upserted row replaces the row with the same key wherever it was.
+# Each version also gets secondary indexes (field -> casefolded value -> row positions) for queries.
+class VersionedSnapshot:
+    def __init__(self, categories, key, indexed=(), history=DELTA_HISTORY):
+        self.key = key
+        self.indexed = ("category",) + tuple(indexed)
+        self.version = 0
+        self.data = {category: [] for category in categories}
+        self.rows = {}  # key -> (category, row)
+        self.deltas = deque(maxlen=history)
+        self.lock = threading.Lock()
+        self.encoded_version = None
+        self.encoded_body = None  # (etag, json bytes, gzipped json bytes)
+        self.flat = []  # (category, row) in snapshot order
+        self.indexes = {field: {} for field in self.indexed}
+        self.query_cache = {}
+
+    # Function to replace the snapshot and return the delta, or None when nothing changed
+    def publish(self, categorized):
+        rows = {}
+        for category, items in categorized.items():
+            for row in items:
+                rows[self.key(row)] = (category, row)
+        with self.lock:
+            upserted = {}
+            for key, entry in rows.items():
+                if self.rows.get(key) != entry:
+                    upserted.setdefault(entry[0], []).append(entry[1])
+            removed = [key for key in self.rows if key not in rows]
+            self.data = categorized
+            self.rows = rows
+            if not upserted and not removed:
+                return None
+            self.version += 1
+            delta = {"version": self.version, "base": self.version - 1, "upserted": upserted, "removed": removed}
+            self.deltas.append(delta)
+            self.build_indexes(rows)
+            return delta
+
+    def build_indexes(self, rows):
+        flat = list(rows.values())
+        indexes = {field: {} for field in self.indexed}
+        for position, (category, row) in enumerate(flat):
+            for field, index in indexes.items():
+                value = category if field == "category" else row.get(field)
+                index.setdefault(str(value).casefold(), []).append(position)
+        self.flat = flat
+        self.indexes = indexes
+        self.query_cache = {}
+
+    # Function to return (category, row) pairs whose indexed fields match; filters maps field -> allowed values
+    def matching(self, filters):
+        with self.lock:
+            flat, indexes = self.flat, self.indexes
+        positions = None
+        # Smallest candidate set first, so each later field only narrows it
+        candidates = []
+        for field, values in filters.items():
+            index = indexes[field]
+            candidates.append(set().union(*(index.get(str(value).casefold(), ()) for value in values)))
+        for candidate in sorted(candidates, key=len):
+            positions = candidate if positions is None else positions & candidate
+        if positions is None:
+            return flat
+        return [flat[position] for position in sorted(positions)]
+
+    # Function to filter, sort and page the rows; returns (rows, next cursor or None, total matches)
+    def query(self, filters, sort=None, descending=False, cursor=None, limit=100):
+        with self.lock:
+            version = self.version
+        cache_key = (version, tuple(sorted((field, tuple(values)) for field, values in filters.items())), sort)
+        ordered = self.query_cache.get(cache_key)
+        if ordered is None:
+            # Ties break on the row key, so cursors stay valid when rows are added or removed between pages
+            ordered = sorted(((sort_value(row.get(sort)) if sort else (1, ""), str(self.key(row))), row)
+                             for _, row in self.matching(filters))
+            keys = [sort_key for sort_key, _ in ordered]
+            ordered = (keys, [row for _, row in ordered])
+            if len(self.query_cache) >= QUERY_CACHE_SIZE:
+                self.query_cache.clear()
+            self.query_cache[cache_key] = ordered
+        keys, rows = ordered
+        if not descending:
+            start = 0 if cursor is None else bisect.bisect_right(keys, decode_cursor(cursor))
+            end = min(len(rows), start + limit)
+            page, last, more = rows[start:end], end - 1, end < len(rows)
+        else:
+            end = len(rows) if cursor is None else bisect.bisect_left(keys, decode_cursor(cursor))
+            start = max(0, end - limit)
+            page, last, more = rows[start:end][::-1], start, start > 0
+        return page, (encode_cursor(keys[last]) if more and page else None), len(rows)
+
+    # Function to return (etag, body, gzipped body) for the data, serialized once per version
+    def encoded(self):
+        with self.lock:
+            if self.encoded_version != self.version or self.encoded_body is None:
+                self.encoded_body = encode(self.data)
+                self.encoded_version = self.version
+            return self.encoded_body
+
+    # Function to return the chosen categories, keeping only rows for the given clients/symbols and the given fields
+    def select(self, categories=None, fields=None, clients=None, symbols=None):
+        data = self.data
+        filters = {field: values for field, values in (("name", clients), ("symbol", symbols)) if values is not None}
+        if filters:
+            data = {}
+            for category, row in self.matching(filters):
+                data.setdefault(category, []).append(row)
+        selected = {}
+        for category in (self.data if categories is None else categories):
+            rows = data.get(category, [])
+            if fields is not None:
+                rows = [{field: row[field] for field in fields if field in row} for row in rows]
+            selected[category] = rows
+        return selected
+
+    def full(self):
+        with self.lock:
+            return {"version": self.version, "data": self.data}
+
+    # Function to return the deltas after `version`, or None if they are no longer kept
+    def since(self, version):
+        with self.lock:
+            if version == self.version:
+                return []
+            if not isinstance(version, int) or version > self.version or not self.deltas \
+                    or version < self.deltas[0]["base"]:
+                return None
+            return [delta for delta in self.deltas if delta["version"] > version]